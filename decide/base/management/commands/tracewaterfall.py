@@ -0,0 +1,53 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Print the spans of a trace as a waterfall, from the span files of all the hosts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('trace_id', nargs='?',
+                            help='trace to show, the last one by default')
+        parser.add_argument('--file', action='append', dest='files',
+                            help='span file, repeat it to join the files of several hosts')
+        parser.add_argument('--width', type=int, default=40, help='width of the bars')
+
+    def handle(self, *args, **options):
+        spans = []
+        for path in options['files'] or [settings.TRACE_FILE]:
+            with open(path) as f:
+                spans.extend(json.loads(line) for line in f if line.strip())
+        if not spans:
+            raise CommandError('No spans')
+
+        trace_id = options['trace_id'] or max(spans, key=lambda s: s['start'])['trace_id']
+        spans = sorted((s for s in spans if s['trace_id'] == trace_id), key=lambda s: s['start'])
+        if not spans:
+            raise CommandError('Trace {} not found'.format(trace_id))
+
+        ids = {s['span_id'] for s in spans}
+        children = {}
+        for s in spans:
+            parent = s['parent_id'] if s['parent_id'] in ids else None
+            children.setdefault(parent, []).append(s)
+
+        start = spans[0]['start']
+        total = max(s['start'] + s['duration'] for s in spans) - start or 1
+        width = options['width']
+
+        self.stdout.write('Trace {}: {:.1f} ms'.format(trace_id, total * 1000))
+
+        def show(span, depth):
+            offset = int((span['start'] - start) / total * width)
+            size = max(1, int(span['duration'] / total * width))
+            bar = ' ' * offset + '#' * size
+            self.stdout.write('{:<{w}} {:>9.1f} ms  {}{} [{}]'.format(
+                bar, span['duration'] * 1000, '  ' * depth, span['name'], span['host'],
+                w=width))
+            for child in children.get(span['span_id'], []):
+                show(child, depth + 1)
+
+        for root in children.get(None, []):
+            show(root, 0)
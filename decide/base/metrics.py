@@ -0,0 +1,145 @@
+'''
+Metrics of the calls between modules and of MixCrypt, kept in memory per
+process and exported in the Prometheus text format by base.views.metrics.
+'''
+
+import re
+import threading
+from bisect import bisect_left
+
+from mixnet import mixcrypt
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        out = []
+        total = 0
+        for le, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            out.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, le, total))
+        out.append('{}_sum{{{}}} {}'.format(name, labels, self.sum))
+        out.append('{}_count{{{}}} {}'.format(name, labels, total))
+        return out
+
+
+_lock = threading.Lock()
+_latency = {}
+_sizes = {}
+_calls = {}
+
+
+def entry_point_label(entry_point):
+    '''
+    Ids in the entry point are replaced so a voting doesn't make new series
+    '''
+
+    return re.sub(r'/\d+(?=/|$)', '/:id', entry_point or '/')
+
+
+def observe_call(modname, entry_point, method, status, seconds, sent, received):
+    # the route can come in the modname too, like 'authentication/login'
+    module, _, route = modname.partition('/')
+    if route:
+        entry_point = '/' + route.strip('/') + (entry_point or '/')
+    key = (module, entry_point_label(entry_point), method)
+    with _lock:
+        if key not in _latency:
+            _latency[key] = Histogram(LATENCY_BUCKETS)
+            _sizes[key, 'sent'] = Histogram(SIZE_BUCKETS)
+            _sizes[key, 'received'] = Histogram(SIZE_BUCKETS)
+        _latency[key].observe(seconds)
+        _sizes[key, 'sent'].observe(sent)
+        _sizes[key, 'received'].observe(received)
+        _calls[key + (str(status),)] = _calls.get(key + (str(status),), 0) + 1
+
+
+def labels(module, entry_point, method, **extra):
+    values = [('module', module), ('entry_point', entry_point), ('method', method)]
+    values += sorted(extra.items())
+    return ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                    for k, v in values)
+
+
+def render():
+    with _lock:
+        out = [
+            '# HELP decide_mods_request_duration_seconds Latency of the calls to other modules.',
+            '# TYPE decide_mods_request_duration_seconds histogram',
+        ]
+        for key, hist in sorted(_latency.items()):
+            out += hist.lines('decide_mods_request_duration_seconds', labels(*key))
+
+        out += [
+            '# HELP decide_mods_payload_bytes Bytes sent and received in the calls to other modules.',
+            '# TYPE decide_mods_payload_bytes histogram',
+        ]
+        for (key, direction), hist in sorted(_sizes.items()):
+            out += hist.lines('decide_mods_payload_bytes', labels(*key, direction=direction))
+
+        out += [
+            '# HELP decide_mods_requests_total Calls to other modules by status code.',
+            '# TYPE decide_mods_requests_total counter',
+        ]
+        for (module, entry_point, method, status), count in sorted(_calls.items()):
+            out.append('decide_mods_requests_total{{{}}} {}'.format(
+                labels(module, entry_point, method, status=status), count))
+    return '\n'.join(out) + '\n'
+
+
+def render_mixcrypt():
+    '''
+    MixCrypt counters of this process
+    '''
+
+    ops = sorted(mixcrypt.counters.snapshot().items())
+    out = [
+        '# HELP decide_mixcrypt_operations_total MixCrypt operations by key bits.',
+        '# TYPE decide_mixcrypt_operations_total counter',
+    ]
+    out += ['decide_mixcrypt_operations_total{{op="{}",bits="{}"}} {}'.format(op, bits, c)
+            for (op, bits), (c, seconds) in ops]
+    out += [
+        '# HELP decide_mixcrypt_seconds_total Wall time of the MixCrypt operations, nested included.',
+        '# TYPE decide_mixcrypt_seconds_total counter',
+    ]
+    out += ['decide_mixcrypt_seconds_total{{op="{}",bits="{}"}} {}'.format(op, bits, seconds)
+            for (op, bits), (c, seconds) in ops]
+
+    primitives = {}
+    for (op, bits), (c, seconds) in ops:
+        modexp, inverse = mixcrypt.PRIMITIVES.get(op, (0, 0))
+        m, i = primitives.get(bits, (0, 0))
+        primitives[bits] = (m + modexp * c, i + inverse * c)
+    out += [
+        '# HELP decide_mixcrypt_modexp_total Modular exponentiations of the MixCrypt operations.',
+        '# TYPE decide_mixcrypt_modexp_total counter',
+    ]
+    out += ['decide_mixcrypt_modexp_total{{bits="{}"}} {}'.format(bits, m)
+            for bits, (m, i) in sorted(primitives.items())]
+    out += [
+        '# HELP decide_mixcrypt_inverse_total Modular inversions of the MixCrypt operations.',
+        '# TYPE decide_mixcrypt_inverse_total counter',
+    ]
+    out += ['decide_mixcrypt_inverse_total{{bits="{}"}} {}'.format(bits, i)
+            for bits, (m, i) in sorted(primitives.items())]
+    return '\n'.join(out) + '\n'
+
+
+def reset():
+    with _lock:
+        _latency.clear()
+        _sizes.clear()
+        _calls.clear()
@@ -1,6 +1,76 @@
+import copy
+import hashlib
+import http.cookiejar
+import json
+import logging
+import time
 import urllib
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics, timing, tracing
+from .singleflight import SingleFlight
+
+
+logger = logging.getLogger(__name__)
+
+
+_session = None
+
+
+def session():
+    '''
+    requests session shared by the calls to other modules, it keeps a pool
+    of keep-alive connections per host instead of connecting on each call.
+    It's shared by every client, so it doesn't keep the cookies set by the
+    modules.
+    '''
+
+    global _session
+    if _session is None:
+        s = requests.Session()
+        s.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=settings.MODS_POOL_CONNECTIONS,
+                              pool_maxsize=settings.MODS_POOL_MAXSIZE)
+        s.mount('http://', adapter)
+        s.mount('https://', adapter)
+        _session = s
+    return _session
+
+
+def module_url(modname, entry_point='/', baseurl=None):
+    if not baseurl:
+        baseurl = settings.APIS.get(modname, settings.BASEURL)
+    return '{}/{}{}'.format(baseurl, modname, entry_point)
+
+
+def send(modname, entry_point, method, url, **kwargs):
+    '''
+    HTTP call to a module recorded in base.metrics and traced in a span
+    sent to the module, calls slower than MODS_SLOW_CALL_SECONDS are logged.
+    '''
+
+    start = time.monotonic()
+    status, sent, received = 'error', 0, 0
+    name = '{} {}{}'.format(method.upper(), modname, entry_point)
+    try:
+        with tracing.span(name, url=url) as s:
+            headers = kwargs.setdefault('headers', {})
+            headers[tracing.HEADER] = s.traceparent()
+            with timing.measure('mods'):
+                response = getattr(session(), method)(url, **kwargs)
+            status = s.attrs['status'] = response.status_code
+        sent = len(response.request.body or b'')
+        received = len(response.content)
+        return response
+    finally:
+        elapsed = time.monotonic() - start
+        metrics.observe_call(modname, entry_point, method, status, elapsed, sent, received)
+        if elapsed >= settings.MODS_SLOW_CALL_SECONDS:
+            logger.warning('slow call %s %s %.3fs status=%s sent=%d received=%d',
+                           method.upper(), url, elapsed, status, sent, received)
 
 
 def query(modname, entry_point='/', method='get', baseurl=None, **kwargs):
@@ -11,6 +81,8 @@ def query(modname, entry_point='/', method='get', baseurl=None, **kwargs):
     :param entry_point: is the path to query
     :param method: is the http method
     :param baseurl: used to override settings module, useful for auths
+    :param timeout: seconds, or (connect, read), to wait for the module,
+                    without limit by default
 
     This function returns the json returned. If there's a problem an
     execption will be raised.
@@ -30,13 +102,7 @@ def query(modname, entry_point='/', method='get', baseurl=None, **kwargs):
     >>> assert(len(r) == len(msgs))
     '''
 
-    if not baseurl:
-        mod = settings.APIS.get(modname, settings.BASEURL)
-    else:
-        mod = baseurl
-
-    q = getattr(requests, method)
-    url = '{}/{}{}'.format(mod, modname, entry_point)
+    url = module_url(modname, entry_point, baseurl)
 
     headers = {}
     if 'HTTP_AUTHORIZATION' in kwargs:
@@ -46,20 +112,65 @@ def query(modname, entry_point='/', method='get', baseurl=None, **kwargs):
     if params:
         url += '?{}'.format(urllib.parse.urlencode(params))
 
+    # GET bodies with an ETag are kept to revalidate them with If-None-Match,
+    # only when returning the json, callers asking for the response get it
+    etag_key = None
+    cached = None
+    if method == 'get' and not kwargs.get('response', False):
+        etag_key = 'mods-etag-{}'.format(hashlib.sha1(
+            '{} {}'.format(url, headers.get('Authorization', '')).encode()).hexdigest())
+        cached = cache.get(etag_key)
+        if cached:
+            headers['If-None-Match'] = cached[0]
+
+    timeout = kwargs.get('timeout')
     if method == 'get':
-        response = q(url, headers=headers)
+        response = send(modname, entry_point, method, url, headers=headers, timeout=timeout)
     else:
         json_data = kwargs.get('json', {})
-        response = q(url, json=json_data, headers=headers)
+        response = send(modname, entry_point, method, url, json=json_data, headers=headers,
+                        timeout=timeout)
 
     if kwargs.get('response', False):
         return response
-    else:
-        return response.json()
+
+    if cached and response.status_code == 304:
+        return cached[1]
+
+    data = response.json()
+    if etag_key and response.status_code == 200 and response.headers.get('ETag'):
+        cache.set(etag_key, (response.headers['ETag'], data))
+    return data
+
+
+def is_local(modname):
+    '''
+    True when the module runs in this deployment, so it can be called
+    in-process instead of through its API.
+    '''
+
+    apis = getattr(settings, 'APIS', {})
+    return (modname in settings.MODULES and
+            apis.get(modname, settings.BASEURL) == settings.BASEURL)
+
+
+# identical GETs in flight in this process, see get
+_flights = SingleFlight()
 
 
 def get(*args, **kwargs):
-    return query(*args, method='get', **kwargs)
+    '''
+    GETs returning the json are coalesced: while one is in flight, the
+    identical calls of other threads wait for it instead of sending it
+    again. Each caller gets its own copy of the result.
+    '''
+
+    if kwargs.get('response', False):
+        return query(*args, method='get', **kwargs)
+
+    key = json.dumps([args, kwargs], sort_keys=True, default=str)
+    data = _flights.do(key, lambda: query(*args, method='get', **kwargs))
+    return copy.deepcopy(data)
 
 
 def post(*args, **kwargs):
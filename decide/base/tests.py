@@ -1,8 +1,15 @@
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import requests
 from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
 from rest_framework.test import APIClient
 from rest_framework.test import APITestCase
 
-from base import mods
+from base import metrics, mods
 
 
 class BaseTestCase(APITestCase):
@@ -12,6 +19,14 @@ class BaseTestCase(APITestCase):
         self.token = None
         mods.mock_query(self.client)
 
+        # the census index, the turnout and the booth bundles go to a
+        # temporary directory, not to the ones of the project
+        self.files_root = tempfile.TemporaryDirectory()
+        self.roots = self.settings(CENSUS_INDEX_ROOT=self.files_root.name,
+                                   TURNOUT_ROOT=self.files_root.name,
+                                   VOTING_BUNDLE_ROOT=self.files_root.name)
+        self.roots.enable()
+
         user_noadmin = User(username='noadmin')
         user_noadmin.set_password('qwerty')
         user_noadmin.save()
@@ -23,6 +38,8 @@ class BaseTestCase(APITestCase):
     def tearDown(self):
         self.client = None
         self.token = None
+        self.roots.disable()
+        self.files_root.cleanup()
 
     def login(self, user='admin', password='qwerty'):
         data = {'username': user, 'password': password}
@@ -34,3 +51,77 @@ class BaseTestCase(APITestCase):
 
     def logout(self):
         self.client.credentials()
+
+
+class ModsGetTestCase(SimpleTestCase):
+
+    def test_get_single_flight(self):
+        calls = []
+
+        def query(modname, **kwargs):
+            calls.append(kwargs.get('params'))
+            time.sleep(0.2)
+            return [{'id': 1}]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            mods.get('voting', params={'id': 1}))) for i in range(5)]
+        with mock.patch.object(mods, 'query', side_effect=query):
+            for t in threads:
+                t.start()
+            mods.get('voting', params={'id': 2})
+            for t in threads:
+                t.join()
+
+        self.assertEqual(calls.count({'id': 1}), 1)
+        self.assertEqual(calls.count({'id': 2}), 1)
+        self.assertEqual(results, [[{'id': 1}]] * 5)
+        # each caller gets its own copy
+        results[0][0]['id'] = 3
+        self.assertEqual(results[1][0]['id'], 1)
+
+
+class ModsMetricsTestCase(SimpleTestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_metrics(self):
+        with self.settings(MODS_SLOW_CALL_SECONDS=0), self.assertLogs('base.mods') as logs:
+            with self.assertRaises(requests.ConnectionError):
+                mods.send('census/12', '/', 'get', 'http://127.0.0.1:1/census/12/')
+        self.assertIn('slow call GET http://127.0.0.1:1/census/12/', logs.output[0])
+
+        metrics.observe_call('authentication', '/login/', 'post', 200, 0.02, 30, 3000)
+        metrics.observe_call('authentication/login', '/', 'post', 400, 2, 30, 10)
+
+        with self.settings(METRICS_TOKEN='s3cret'):
+            response = self.client.get('/base/metrics/', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('decide_mods_requests_total{module="census",entry_point="/:id/",'
+                      'method="get",status="error"} 1', text)
+        login = 'module="authentication",entry_point="/login/",method="post"'
+        self.assertIn('decide_mods_requests_total{%s,status="200"} 1' % login, text)
+        self.assertIn('decide_mods_request_duration_seconds_bucket{%s,le="0.025"} 1' % login, text)
+        self.assertIn('decide_mods_request_duration_seconds_bucket{%s,le="+Inf"} 2' % login, text)
+        self.assertIn('decide_mods_payload_bytes_sum{%s,direction="received"} 3010' % login, text)
+
+        # the address of the client is not enough, it's the one of the proxy
+        response = self.client.get('/base/metrics/', REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 403)
+        with self.settings(METRICS_TOKEN='s3cret'):
+            response = self.client.get('/base/metrics/', HTTP_AUTHORIZATION='Bearer other')
+        self.assertEqual(response.status_code, 403)
+
+
+class MetricsAccessTestCase(TestCase):
+
+    def test_staff(self):
+        user = User.objects.create_user('metrics', password='qwerty')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/base/metrics/').status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get('/base/metrics/').status_code, 200)
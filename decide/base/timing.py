@@ -0,0 +1,99 @@
+'''
+Time spent by each request in SQL, in calls to other modules and in
+MixCrypt operations, reported in the Server-Timing header.
+'''
+
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from mixnet import mixcrypt
+
+
+logger = logging.getLogger(__name__)
+
+_timings = contextvars.ContextVar('decide_timings', default=None)
+_lock = threading.Lock()
+
+KINDS = (
+    ('db', 'queries'),
+    ('mods', 'calls'),
+    ('crypto', 'ops'),
+)
+
+
+def record(kind, seconds):
+    timings = _timings.get()
+    if timings is None:
+        return
+    with _lock:
+        count, total = timings.get(kind, (0, 0))
+        timings[kind] = (count + 1, total + seconds)
+
+
+@contextmanager
+def measure(kind):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, time.perf_counter() - start)
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    with measure('db'):
+        return execute(sql, params, many, context)
+
+
+def crypto_hook(operation, seconds):
+    record('crypto', seconds)
+
+
+mixcrypt.hooks.append(crypto_hook)
+
+
+def server_timing(timings, total):
+    values = []
+    for kind, unit in KINDS:
+        count, seconds = timings.get(kind, (0, 0))
+        values.append('{};dur={:.1f};desc="{} {}"'.format(kind, seconds * 1000, count, unit))
+    values.append('total;dur={:.1f}'.format(total * 1000))
+    return ', '.join(values)
+
+
+class ServerTimingMiddleware:
+    '''
+    Measures the request and adds the Server-Timing header when
+    SERVER_TIMING_HEADER is set, SERVER_TIMING_LOG_SAMPLE is the fraction
+    of the requests logged.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        total = time.perf_counter() - start
+
+        header = server_timing(timings, total)
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = header
+        if random.random() < settings.SERVER_TIMING_LOG_SAMPLE:
+            logger.info('%s %s %s %s', request.method, request.path,
+                        response.status_code, header)
+        return response
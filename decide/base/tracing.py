@@ -0,0 +1,156 @@
+'''
+Trace context shared by the modules and the authorities of a tally.
+
+The current span is kept in a context variable. base.mods sends it to the
+called module in the W3C "traceparent" header, and TraceMiddleware picks it
+up so the spans of every host share the trace id. Finished spans are
+written as json lines by the TRACE_EXPORTER ("stdout" or "file", None to
+disable it), the tracewaterfall command rebuilds a trace from them.
+'''
+
+import contextvars
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+HEADER = 'traceparent'
+
+_current = contextvars.ContextVar('decide_span', default=None)
+_write_lock = threading.Lock()
+
+
+class Span:
+    def __init__(self, name, trace_id=None, parent_id=None, **attrs):
+        self.name = name
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration = None
+
+    def traceparent(self):
+        return '00-{}-{}-01'.format(self.trace_id, self.span_id)
+
+    def as_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'start': self.start,
+            'duration': self.duration,
+            'attrs': self.attrs,
+        }
+
+
+def parse_traceparent(value):
+    '''
+    (trace_id, parent span_id) of a traceparent header, or (None, None)
+    '''
+
+    parts = (value or '').split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None, None
+    return parts[1], parts[2]
+
+
+def current_span():
+    return _current.get()
+
+
+def inject(headers):
+    '''
+    Adds the traceparent of the current span to the headers of a call
+    '''
+
+    s = _current.get()
+    if s:
+        headers[HEADER] = s.traceparent()
+    return headers
+
+
+def export(span):
+    exporter = getattr(settings, 'TRACE_EXPORTER', None)
+    if not exporter:
+        return
+
+    line = json.dumps(span.as_dict()) + '\n'
+    with _write_lock:
+        if exporter == 'stdout':
+            sys.stdout.write(line)
+            sys.stdout.flush()
+        else:
+            with open(settings.TRACE_FILE, 'a') as f:
+                f.write(line)
+
+
+@contextmanager
+def span(name, traceparent=None, **attrs):
+    '''
+    Runs the block in a new span, child of the current one or of the
+    traceparent given. Yields the span so attributes can be added.
+    '''
+
+    parent = _current.get()
+    if traceparent:
+        trace_id, parent_id = parse_traceparent(traceparent)
+    elif parent:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_id = None, None
+
+    s = Span(name, trace_id, parent_id, **attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except Exception as e:
+        s.attrs['error'] = type(e).__name__
+        raise
+    finally:
+        s.duration = time.time() - s.start
+        _current.reset(token)
+        export(s)
+
+
+class TraceMiddleware:
+    '''
+    Runs each request in a span, continuing the trace of the caller
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        name = '{} {}'.format(request.method, request.path)
+        with span(name, traceparent=request.headers.get(HEADER)) as s:
+            response = self.get_response(request)
+            s.attrs['status'] = response.status_code
+        return response
+
+
+def propagate(fn):
+    '''
+    fn running with the context of this thread, so the current span is the
+    parent, when it's called from another thread, like the calls of a
+    ThreadPoolExecutor
+    '''
+
+    ctx = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+    return run
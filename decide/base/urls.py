@@ -1 +1,7 @@
-urlpatterns = []
+from django.urls import path
+from . import views
+
+
+urlpatterns = [
+    path('metrics/', views.metrics, name='metrics'),
+]
@@ -1,3 +1,22 @@
-from django.shortcuts import render
+import hmac
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import metrics as mods_metrics
+
+
+def metrics(request):
+    '''
+    Metrics of the calls of this process to other modules and of its
+    MixCrypt operations, in the Prometheus text format. Only for staff users
+    or the scraper with the METRICS_TOKEN.
+    '''
+
+    token = settings.METRICS_TOKEN
+    auth = request.headers.get('Authorization', '')
+    scraper = bool(token) and hmac.compare_digest(auth.encode(), 'Bearer {}'.format(token).encode())
+    if not scraper and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(mods_metrics.render() + mods_metrics.render_mixcrypt(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,5 +1,11 @@
+import json
+
+from django.conf import settings
 from django.test import TestCase
+from base.models import Key
 from base.tests import BaseTestCase
+from voting.bundle import bundle_storage
+from voting.models import Question, QuestionOption, Voting
 
 
 # Create your tests here.
@@ -21,4 +27,47 @@ class BoothTestCase(BaseTestCase):
         response = self.client.get('/booth/10000')
         self.assertEqual(response.status_code, 301)
 
-       
\ No newline at end of file
+       
+class BoothBundleTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        q = Question.objects.create(desc='bundle question')
+        for i in range(3):
+            QuestionOption(question=q, option='option {}'.format(i + 1)).save()
+        self.voting = Voting.objects.create(name='bundle voting', question=q,
+                                            pub_key=Key.objects.create(p=23, g=5, y=8))
+
+    def tearDown(self):
+        if self.voting.bundle:
+            bundle_storage.delete(self.voting.bundle)
+        super().tearDown()
+
+    def testPublishBundle(self):
+        self.voting.publish_bundle()
+        with bundle_storage.open(self.voting.bundle) as f:
+            bundle = json.loads(f.read())
+
+        self.assertEqual(bundle['id'], self.voting.id)
+        self.assertEqual(bundle['pub_key'], {'p': '23', 'g': '5', 'y': '8'})
+        self.assertEqual(len(bundle['question']['options']), 3)
+        self.assertEqual(bundle['KEYBITS'], settings.KEYBITS)
+
+        # same content, same immutable file
+        name = self.voting.bundle
+        self.voting.publish_bundle()
+        self.assertEqual(self.voting.bundle, name)
+
+    def testNoBundleWithoutKey(self):
+        self.voting.pub_key = None
+        self.voting.save()
+        self.voting.publish_bundle()
+        self.assertIsNone(self.voting.bundle)
+        response = self.client.get('/booth/{}/'.format(self.voting.id))
+        self.assertEqual(response.status_code, 404)
+
+    def testBoothUsesBundle(self):
+        self.voting.publish_bundle()
+        response = self.client.get('/booth/{}/'.format(self.voting.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['bundle_url'],
+                         bundle_storage.url(self.voting.bundle))
@@ -4,6 +4,8 @@ from django.conf import settings
 from django.http import Http404
 
 from base import mods
+from voting.bundle import bundle_storage
+from voting.models import Voting
 
 
 # TODO: check permissions and census
@@ -14,6 +16,14 @@ class BoothView(TemplateView):
         context = super().get_context_data(**kwargs)
         vid = kwargs.get('voting_id', 0)
 
+        # a started voting has a published bundle, the browser loads it from
+        # static storage and we save the voting API call
+        bundle = Voting.objects.filter(pk=vid).values_list('bundle', flat=True).first()
+        if bundle:
+            context['bundle_url'] = bundle_storage.url(bundle)
+            context['KEYBITS'] = settings.KEYBITS
+            return context
+
         try:
             r = mods.get('voting', params={'id': vid})
             # Casting numbers to string to manage in javascript with BigInt
@@ -0,0 +1,97 @@
+import mmap
+import os
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+
+# mapped index files of this process by path, with the stat used to see
+# when another process rebuilds them
+_maps = {}
+
+
+def index_path(voting_id):
+    return os.path.join(settings.CENSUS_INDEX_ROOT, 'census-{}.bin'.format(voting_id))
+
+
+def write_index(voting_id, voter_ids):
+    '''
+    Writes the census membership index of a voting: a bitmap where the bit
+    voter_id is set for each voter in the census. The file is replaced
+    atomically, so the workers reading it never see it half written.
+    '''
+
+    bitmap = bytearray(1)
+    for uid in voter_ids:
+        byte = uid >> 3
+        if byte >= len(bitmap):
+            bitmap.extend(bytes(byte + 1 - len(bitmap)))
+        bitmap[byte] |= 1 << (uid & 7)
+
+    path = index_path(voting_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # a unique name, the threads of a process can write it at the same time
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with open(fd, 'wb') as f:
+        f.write(bitmap)
+    os.replace(tmp, path)
+
+
+def build_voting_index(voting):
+    voter_ids = []
+    if voting.census_id:
+        voter_ids = voting.census.users.values_list('id', flat=True).iterator()
+    write_index(voting.id, voter_ids)
+
+
+def rebuild_census_index(census):
+    '''
+    Rebuilds the index of the started votings of this census
+    '''
+
+    for voting in census.census_id.exclude(start_date=None):
+        build_voting_index(voting)
+
+
+def lookup(voting_id, voter_id):
+    '''
+    True if the voter is in the voting census index, None if the voting has
+    no index. The file is mapped once per process and shared by the page
+    cache between workers.
+    '''
+
+    path = index_path(voting_id)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _maps.get(path)
+    if not cached or cached[0] != key:
+        with open(path, 'rb') as f:
+            cached = (key, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        _maps[path] = cached
+
+    bitmap = cached[1]
+    byte = voter_id >> 3
+    return 0 <= byte < len(bitmap) and bool(bitmap[byte] & (1 << (voter_id & 7)))
+
+
+def is_member(voting_id, voter_id):
+    '''
+    Census check of a voter, from the index or from the database when the
+    voting has no index (not started yet).
+    '''
+
+    try:
+        voting_id, voter_id = int(voting_id), int(voter_id)
+    except (TypeError, ValueError):
+        return False
+
+    member = lookup(voting_id, voter_id)
+    if member is None:
+        User = get_user_model()
+        member = User.objects.filter(pk=voter_id, census__census_id=voting_id).exists()
+    return member
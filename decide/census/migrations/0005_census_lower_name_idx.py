@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-19 15:05
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('census', '0004_census_has_voted'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='census',
+            index=models.Index(django.db.models.functions.text.Lower('name'), models.F('id'), name='census_lower_name_id_idx'),
+        ),
+    ]
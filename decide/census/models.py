@@ -1,15 +1,43 @@
 from django.db import models
+from django.db.models.functions import Lower
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
 from django.conf import settings
 
+from .index import rebuild_census_index
+
 
 class Census(models.Model):
     name = models.CharField(max_length=200)
     users = models.ManyToManyField(settings.AUTH_USER_MODEL)
     has_voted = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(Lower('name'), 'id', name='census_lower_name_id_idx'),
+        ]
+
     def __str__(self):
         return self.name   
 
 
 class Votation(models.Model):
     census = models.ForeignKey(Census, on_delete=models.CASCADE)
+
+
+@receiver(m2m_changed, sender=Census.users.through)
+def census_users_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # a clear from the user side has no pk_set, its censuses are kept
+    # before the clear to rebuild them after it
+    if reverse and action == 'pre_clear':
+        instance._cleared_census = list(instance.census_set.values_list('pk', flat=True))
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        rebuild_census_index(instance)
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_census', [])
+    if pk_set:
+        for census in Census.objects.filter(pk__in=pk_set):
+            rebuild_census_index(census)
@@ -1,8 +1,10 @@
 import csv
 import json
 import tempfile
+import threading
 import os
 from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
@@ -15,10 +17,12 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
 
+from . import index
 from .models import Census
-from voting.models import Voting
+from voting.models import Question, Voting
 from base.tests import BaseTestCase
-from datetime import datetime, timezone
+from datetime import datetime
+from django.utils import timezone
 
 class BaseExportTestCase(TestCase):
     def setUp(self):
@@ -66,6 +70,127 @@ class CensusTestCase(BaseTestCase):
         super().tearDown()
         self.census = None
         
+    def test_bulk_create(self):
+        users = [User.objects.create(username='voter{}'.format(i)) for i in range(5)]
+        self.census.users.add(users[0])
+        data = {'census_id': self.census.id,
+                'voters': [u.id for u in users] + [users[1].id, 999999]}
+
+        response = self.client.post('/census/create/', data, format='json')
+        self.assertEqual(response.status_code, 401)
+
+        self.login()
+        response = self.client.post('/census/create/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['inserted'], 4)
+        self.assertEqual(response.json()['skipped'], 3)
+        self.assertEqual(self.census.users.count(), 5)
+
+    def test_bulk_create_csv(self):
+        users = [User.objects.create(username='voter{}'.format(i)) for i in range(3)]
+        voting = Voting.objects.create(name='csv voting',
+                                       question=Question.objects.create(desc='q'))
+        content = 'voter_id\n' + ''.join('{}\n'.format(u.id) for u in users)
+        upload = SimpleUploadedFile('census.csv', content.encode())
+
+        self.login()
+        # reading it doesn't create the voting census
+        response = self.client.get('/census/create/?voting_id={}'.format(voting.id))
+        self.assertEqual(response.json()['voters'], [])
+        voting.refresh_from_db()
+        self.assertIsNone(voting.census)
+
+        response = self.client.post('/census/create/',
+                                    {'voting_id': voting.id, 'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['inserted'], 3)
+
+        voting.refresh_from_db()
+        self.assertEqual(list(voting.census.users.order_by('id')), users)
+        response = self.client.get('/census/create/?voting_id={}'.format(voting.id))
+        self.assertEqual(sorted(response.json()['voters']), [u.id for u in users])
+
+    def test_census_index(self):
+        with tempfile.TemporaryDirectory() as root, self.settings(CENSUS_INDEX_ROOT=root):
+            users = [User.objects.create(username='voter{}'.format(i)) for i in range(3)]
+            self.census.users.add(users[0], users[1])
+            voting = Voting.objects.create(name='index voting', census=self.census,
+                                           question=Question.objects.create(desc='q'))
+            url = '/census/{}/?voter_id={}'
+
+            # not started, checked in the database
+            self.assertIsNone(index.lookup(voting.id, users[0].id))
+            response = self.client.get(url.format(voting.id, users[0].id))
+            self.assertEqual(response.status_code, 200)
+
+            voting.start_date = timezone.now()
+            voting.save()
+            index.build_voting_index(voting)
+            self.assertTrue(index.lookup(voting.id, users[1].id))
+            self.assertFalse(index.lookup(voting.id, users[2].id))
+            self.assertFalse(index.lookup(voting.id, 10 ** 6))
+            response = self.client.get(url.format(voting.id, users[2].id))
+            self.assertEqual(response.status_code, 401)
+
+            # census changes rebuild the index
+            self.census.users.add(users[2])
+            self.census.users.remove(users[0])
+            with self.assertNumQueries(0):
+                response = self.client.get(url.format(voting.id, users[2].id))
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(index.is_member(voting.id, users[0].id))
+
+            # and from the user side too
+            users[1].census_set.clear()
+            self.assertFalse(index.is_member(voting.id, users[1].id))
+            self.assertTrue(index.is_member(voting.id, users[2].id))
+
+    def test_index_concurrent_writes(self):
+        errors = []
+
+        def write():
+            try:
+                for i in range(50):
+                    index.write_index(1, [1, 2, 3])
+            except Exception as e:
+                errors.append(e)
+
+        with tempfile.TemporaryDirectory() as root, self.settings(CENSUS_INDEX_ROOT=root):
+            threads = [threading.Thread(target=write) for i in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(errors, [])
+            self.assertTrue(index.lookup(1, 2))
+            self.assertEqual(os.listdir(root), ['census-1.bin'])
+
+    def test_census_pages(self):
+        for name in ('b', 'A', 'c', 'B'):
+            Census.objects.create(name=name)
+        users = [User.objects.create(username='voter{}'.format(i)) for i in range(5)]
+        self.census.users.add(*users)
+
+        with self.settings(CENSUS_PAGE_SIZE=2):
+            response = self.client.get('/census/')
+            names = [c.name for c in response.context['census_list']]
+            self.assertEqual(names, ['', 'A'])
+            after = response.context['next_after']
+
+            response = self.client.get('/census/?after={}'.format(after))
+            self.assertEqual([c.name.lower() for c in response.context['census_list']], ['b', 'b'])
+            response = self.client.get('/census/?after={}'.format(response.context['next_after']))
+            self.assertEqual([c.name for c in response.context['census_list']], ['c'])
+            self.assertIsNone(response.context['next_after'])
+
+            url = '/census/search/?census_id={}'.format(self.census.id)
+            response = self.client.get(url)
+            self.assertEqual(list(response.context['object_list']), users[:2])
+            response = self.client.get('{}&after={}'.format(url, users[3].id))
+            self.assertEqual(list(response.context['object_list']), users[4:])
+            self.assertIsNone(response.context['next_after'])
+
+
 class CensusTest(StaticLiveServerTestCase):
     def setUp(self):
         #Load base test functionality for decide
@@ -218,7 +343,7 @@ class ExportCensusJSONTest(BaseExportTestCase):
         response = self.client.get(url_exportacion)
         self.assertEqual(response.status_code, 200)
 
-        datos_exportados = json.loads(response.content.decode('utf-8'))
+        datos_exportados = json.loads(b''.join(response.streaming_content).decode('utf-8'))
 
         self.assertIsInstance(datos_exportados, list)
         self.assertEqual(len(datos_exportados), len(self.census_create))
@@ -228,12 +353,28 @@ class ExportCensusJSONTest(BaseExportTestCase):
             if indice < len(self.census_create):
                 self.assertCheckCreatedCensusDataEqualsCensusData(datos_censo_exportado, self.census_create[indice])
 
+    def testExportJsonNumQueries(self):
+        census = Census.objects.create(name='Census_voting')
+        census.users.set([self.user3])
+        Voting.objects.create(name='voting', question=Question.objects.create(desc='q'),
+                              census=census)
+
+        response = self.client.get(reverse('export_census_json'))
+        # census, users and votings are loaded once for all the census
+        with self.assertNumQueries(3):
+            content = b''.join(response.streaming_content)
+
+        datos_exportados = json.loads(content.decode('utf-8'))
+        self.assertEqual(len(datos_exportados), len(self.census_create) + 1)
+        self.assertEqual(datos_exportados[-1]['users'], ['user3'])
+        self.assertEqual(datos_exportados[-1]['votings'], ['voting'])
+
     def testExportedJsonFile(self):
         url_exportacion = reverse('export_census_json')
         response = self.client.get(url_exportacion)
         self.assertEqual(response.status_code, 200)
 
-        datos_respuesta = json.loads(response.content.decode('utf-8'))
+        datos_respuesta = json.loads(b''.join(response.streaming_content).decode('utf-8'))
 
         # Creamos un archivo temporal con extensión .json para almacenar los datos exportados
         with tempfile.NamedTemporaryFile(suffix='.json', delete=False, mode='w+b') as archivo_temporal:
@@ -268,7 +409,7 @@ class ExportCensusCSVTest(BaseExportTestCase):
         response = self.client.get(url_exportacion_csv)
         self.assertEqual(response.status_code, 200)
 
-        lineas_respuesta_csv = response.content.decode('utf-8').splitlines()
+        lineas_respuesta_csv = b''.join(response.streaming_content).decode('utf-8').splitlines()
         encabezados = ['name', 'users', 'votings', 'has_voted']
         self.assertEqual(lineas_respuesta_csv[0].split(','), encabezados)
 
@@ -278,13 +419,13 @@ class ExportCensusCSVTest(BaseExportTestCase):
         self.assertEqual(response.status_code, 200)
 
         # Utilizamos csv.reader para manejar automáticamente las diferencias de formato en las nuevas líneas
-        lineas_respuesta_csv = list(csv.reader(response.content.decode('utf-8').splitlines()))
+        lineas_respuesta_csv = list(csv.reader(b''.join(response.streaming_content).decode('utf-8').splitlines()))
 
         # Creamos un archivo temporal con extensión .csv para almacenar los datos exportados
         with tempfile.NamedTemporaryFile(mode='w+', suffix='.csv', delete=False) as archivo_temporal:
             # Realizamos otra solicitud GET a la URL de exportación y escribimos la respuesta en el archivo temporal
             response_segunda = self.client.get(url_exportacion_csv)
-            archivo_temporal.write(response_segunda.content.decode('utf-8'))
+            archivo_temporal.write(b''.join(response_segunda.streaming_content).decode('utf-8'))
 
         try:
             self.assertEqual(response_segunda.status_code, 200)
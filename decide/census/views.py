@@ -1,4 +1,9 @@
+import itertools
 import json
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.shortcuts import get_object_or_404
 from django.views.generic import TemplateView,ListView
 from django.db.utils import IntegrityError
 from django.core.exceptions import ObjectDoesNotExist
@@ -13,10 +18,13 @@ from rest_framework.status import (
         HTTP_409_CONFLICT as ST_409
 )
 from base.perms import UserIsStaff
+from .index import is_member, rebuild_census_index
 from .models import Census
 from voting.models import Voting
 
-from django.http import HttpResponse
+from django.db.models import Prefetch, Q
+from django.db.models.functions import Lower
+from django.http import HttpResponse, StreamingHttpResponse
 import csv
 import json
 
@@ -26,47 +34,150 @@ from django.shortcuts import render, redirect
 from .forms import FormularioPeticion
 from django.core.mail import EmailMessage
 
+def census_by_name():
+    return Census.objects.annotate(lower_name=Lower('name')).order_by('lower_name', 'id')
+
+
+def page_after(request):
+    after = request.GET.get('after', '')
+    return int(after) if after.isdigit() else None
+
+
 class CensusList(ListView):
+    '''
+    Census ordered by name, in pages of CENSUS_PAGE_SIZE. The next page
+    starts after the (lower(name), id) of the last census of this one, the
+    lower_name >= bound lets it start with a range scan of
+    census_lower_name_id_idx at any depth.
+    '''
+
     model = Census
+    template_name = 'census/census_list.html'
+    context_object_name = 'census_list'
+
+    def get_queryset(self):
+        census = census_by_name()
+        after = page_after(self.request)
+        if after is not None:
+            last = census.filter(pk=after).values_list('lower_name', flat=True).first()
+            if last is not None:
+                census = census.filter(lower_name__gte=last).filter(
+                    Q(lower_name__gt=last) | Q(lower_name=last, id__gt=after))
+
+        page = list(census[:settings.CENSUS_PAGE_SIZE + 1])
+        self.has_next = len(page) > settings.CENSUS_PAGE_SIZE
+        return page[:settings.CENSUS_PAGE_SIZE]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        censo = Census.objects.all()
-        context['name'] = sorted(censo, key=lambda obj: obj.name.lower())
+        census = context['census_list']
+        context['next_after'] = census[-1].id if self.has_next else None
         return context
 
 class CensusResultsView(ListView):
-    model = Census
+    '''
+    Voters of a census ordered by id, in pages of CENSUS_PAGE_SIZE starting
+    after the voter id given in the "after" param.
+    '''
+
     template_name = 'census/results.html'
 
+    def get_queryset(self):
+        self.census = get_object_or_404(Census, id=self.request.GET.get('census_id'))
+        voters = self.census.users.order_by('id').only('id', 'username')
+        after = page_after(self.request)
+        if after is not None:
+            voters = voters.filter(id__gt=after)
+
+        page = list(voters[:settings.CENSUS_PAGE_SIZE + 1])
+        self.has_next = len(page) > settings.CENSUS_PAGE_SIZE
+        return page[:settings.CENSUS_PAGE_SIZE]
+
     def get_context_data(self,*args,**kwargs):  # new
-        query = self.request.GET.get("census_id")
-        census = Census.objects.get(id=query)
-        object_list = census.users.all()
-        voting_list = Voting.objects.filter(census=query)
         context = super(CensusResultsView, self).get_context_data(*args,**kwargs)
-        context['object_list'] = object_list
-        context['voting_list'] = voting_list
-        context['censo_id'] = query
+        object_list = context['object_list']
+        context['voting_list'] = Voting.objects.filter(census=self.census)
+        context['censo_id'] = self.census.id
+        context['next_after'] = object_list[-1].id if self.has_next else None
         return context
 
+def voter_batches(voters, size):
+    it = iter(voters)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def csv_voters(upload):
+    '''
+    Voter ids from the first column of an uploaded csv, read line by line
+    so the file is never fully in memory. Headers and blank rows are skipped.
+    '''
+
+    lines = (line.decode('utf-8') for line in upload)
+    for row in csv.reader(lines):
+        if row and row[0].strip().isdigit():
+            yield int(row[0])
+
+
 class CensusCreate(generics.ListCreateAPIView):
     permission_classes = (UserIsStaff,)
 
+    def get_census(self, request, create=False):
+        '''
+        Census of the census_id, or of the voting_id. The voting census is
+        created when there isn't one only with create.
+        '''
+
+        census_id = request.data.get('census_id') or request.GET.get('census_id')
+        voting_id = request.data.get('voting_id') or request.GET.get('voting_id')
+        if census_id:
+            return get_object_or_404(Census, pk=census_id)
+        if voting_id:
+            voting = get_object_or_404(Voting, pk=voting_id)
+            if not voting.census and create:
+                voting.census = Census.objects.create(name=voting.name)
+                voting.save()
+            return voting.census
+        return None
+
     def create(self, request, *args, **kwargs):
-        voting_id = request.data.get('voting_id')
-        voters = request.data.get('voters')
-        try:
-            for voter in voters:
-                census = Census(voting_id=voting_id, voter_id=voter)
-                census.save()
-        except IntegrityError:
-            return Response('Error try to create census', status=ST_409)
-        return Response('Census created', status=ST_201)
+        """
+         * census_id: id / voting_id: id, the voting census is created if needed
+         * voters: [ id ] or file: csv upload with the voter id in the first column
+        """
+
+        census = self.get_census(request, create=True)
+        upload = request.FILES.get('file')
+        voters = csv_voters(upload) if upload else request.data.get('voters')
+        if not census or voters is None:
+            return Response('Error try to create census', status=ST_400)
+
+        Member = Census.users.through
+        members = Member.objects.filter(census_id=census.id)
+        total = 0
+        with transaction.atomic():
+            before = members.count()
+            for batch in voter_batches(voters, settings.CENSUS_BATCH_SIZE):
+                total += len(batch)
+                # unknown users would break the whole insert
+                users = User.objects.filter(pk__in=batch).values_list('pk', flat=True)
+                Member.objects.bulk_create(
+                    [Member(census_id=census.id, user_id=uid) for uid in set(users)],
+                    ignore_conflicts=True)
+            inserted = members.count() - before
+
+        # bulk_create doesn't send m2m_changed
+        rebuild_census_index(census)
+
+        return Response({'census_id': census.id, 'inserted': inserted,
+                         'skipped': total - inserted}, status=ST_201)
 
     def list(self, request, *args, **kwargs):
-        voting_id = request.GET.get('voting_id')
-        voters = Census.objects.filter(voting_id=voting_id).values_list('voter_id', flat=True)
+        census = self.get_census(request)
+        voters = census.users.values_list('id', flat=True) if census else []
         return Response({'voters': voters})
 
 
@@ -80,44 +191,63 @@ class CensusDetail(generics.RetrieveDestroyAPIView):
 
     def retrieve(self, request, voting_id, *args, **kwargs):
         voter = request.GET.get('voter_id')
-        try:
-            Census.objects.get(voting_id=voting_id, voter_id=voter)
-        except ObjectDoesNotExist:
+        if not is_member(voting_id, voter):
             return Response('Invalid voter', status=ST_401)
         return Response('Valid voter')
 
     
+# census loaded per query in the exports, with their users and votings
+EXPORT_CHUNK_SIZE = 100
+
+
+class Echo:
+    '''
+    File-like object for csv.writer that returns the row instead of keeping it
+    '''
+
+    def write(self, value):
+        return value
+
+
+def census_rows(census_data):
+    '''
+    Yields (census, usernames, votings) of each census. Users and votings
+    are loaded in bulk for each chunk of census instead of per census.
+    '''
+
+    census_data = census_data.order_by('id').prefetch_related(
+        Prefetch('users', queryset=User.objects.only('id', 'username').order_by('id')),
+        Prefetch('census_id', queryset=Voting.objects.only('id', 'name', 'census')),
+    )
+    for census in census_data.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        usernames = [user.username for user in census.users.all()]
+        votings = [voting.name for voting in census.census_id.all()]
+        yield census, usernames, votings
+
+
 class ExportCensusCsv(View):
     def get (self, request):
         census_data = Census.objects.all()
         response = self.export_csv(census_data)
         return response
-    
+
     def export_csv(self, census_data):
-        if not census_data:
+        if not census_data.exists():
             return HttpResponse('No data to export excel')
-        
+
         counter = self.request.session.get('download_counter_csv', 1)
         filename = f"censusv{counter}.csv"
         self.request.session['download_counter_csv'] = counter + 1
 
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        writer = csv.writer(response)
-        writer.writerow(['name', 'users', 'votings', 'has_voted'])
-
-        for data in census_data:
-            votQuery = Voting.objects.filter(census=data.id)
-            votings = []
-            for voting in votQuery:
-                votings.append(voting.name)
-            
-            userQuery = data.users.all()
-            usernames = []
-            for user in userQuery:
-                usernames.append(user.username)
-            writer.writerow([data.name, usernames, votings, data.has_voted])
+        writer = csv.writer(Echo())
 
+        def rows():
+            yield writer.writerow(['name', 'users', 'votings', 'has_voted'])
+            for data, usernames, votings in census_rows(census_data):
+                yield writer.writerow([data.name, usernames, votings, data.has_voted])
+
+        response = StreamingHttpResponse(rows(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
 
 class ExportCensusJson(View):
@@ -125,31 +255,24 @@ class ExportCensusJson(View):
         census_data = Census.objects.all()
         response = self.export_json(census_data)
         return response
-    
+
     def export_json(self, census_data):
-        if not census_data:
+        if not census_data.exists():
             return HttpResponse('No data to export excel')
-        
-        data = []
-        for c in census_data:
-            votQuery = Voting.objects.filter(census=c.id)
-            votings = []
-            for voting in votQuery:
-                votings.append(voting.name)
-            
-            userQuery = c.users.all()
-            usernames = []
-            for user in userQuery:
-                usernames.append(user.username)
-
-            data.append({'name': c.name, 'users': usernames, 'votings': votings, 'has_voted': c.has_voted})
-
-        data_json = json.dumps(data)
+
         counter = self.request.session.get('download_counter', 1)
         filename = f"censusv{counter}.json"
         self.request.session['download_counter'] = counter + 1
 
-        response = HttpResponse(data_json, content_type='text/json')
+        def items():
+            sep = '['
+            for c, usernames, votings in census_rows(census_data):
+                yield sep + json.dumps({'name': c.name, 'users': usernames,
+                                        'votings': votings, 'has_voted': c.has_voted})
+                sep = ', '
+            yield ']' if sep == ', ' else '[]'
+
+        response = StreamingHttpResponse(items(), content_type='text/json')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
 
         return response
@@ -75,6 +75,8 @@ MODULES = [
 BASEURL = 'http://localhost:8000'
 
 MIDDLEWARE = [
+    'base.tracing.TraceMiddleware',
+    'base.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -160,9 +162,97 @@ TEST_RUNNER = 'django_nose.NoseTestSuiteRunner'
 
 STATIC_URL = '/static/'
 
+# published voting bundles for the booth, the web server should serve them
+VOTING_BUNDLE_ROOT = os.path.join(BASE_DIR, 'bundles')
+VOTING_BUNDLE_URL = '/bundles/'
+
 # number of bits for the key, all auths should use the same number of bits
 KEYBITS = 256
 
+# key shares kept ready by the fillkeypool command, so starting a voting
+# doesn't wait for the key generation
+KEY_POOL_SIZE = 50
+
+# the first auth asks all the others for their key at the same time instead
+# of the chained call, every auth must run a version that knows "chain"
+MIXNET_KEY_FANOUT = False
+
+# voters inserted per statement in the census bulk load
+CENSUS_BATCH_SIZE = 1000
+
+# census and voters shown per page in the census search
+CENSUS_PAGE_SIZE = 100
+
+# census membership index files, shared by all the workers of a host
+CENSUS_INDEX_ROOT = os.path.join(BASE_DIR, 'census_index')
+
+# per voting turnout bitmaps, all the store workers must share this directory
+TURNOUT_ROOT = os.path.join(BASE_DIR, 'turnout')
+
+# Cache used for the voting API bodies. With several workers this should be
+# a shared backend (memcached, redis) so invalidation reaches every worker
+# the cached votings are invalidated in this cache, a deployment with
+# several processes needs a shared backend, see the docker and vagrant
+# settings
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# seconds a cached voting body is kept, it's invalidated on voting save too
+VOTING_CACHE_TIMEOUT = 300
+
+# keep-alive connections kept by base.mods to the other modules: hosts in
+# the pool and connections per host, at least the number of worker threads
+MODS_POOL_CONNECTIONS = 10
+MODS_POOL_MAXSIZE = 20
+
+# calls to other modules slower than this are logged by base.mods
+MODS_SLOW_CALL_SECONDS = 1
+
+# bearer token of the scraper of the /base/metrics/ endpoint, staff users
+# can read it too. None to allow only staff users
+METRICS_TOKEN = None
+
+# where the finished trace spans are written: None, 'stdout' or 'file',
+# see base.tracing
+TRACE_EXPORTER = None
+TRACE_FILE = os.path.join(BASE_DIR, 'traces.jsonl')
+
+# Server-Timing header with the time of each request in SQL, mods calls
+# and MixCrypt, and the fraction of the requests logged by base.timing
+SERVER_TIMING_HEADER = True
+SERVER_TIMING_LOG_SAMPLE = 0.0
+
+# seconds the gateway waits to connect and for the module response
+GATEWAY_TIMEOUT = (5, 60)
+GATEWAY_CHUNK_SIZE = 64 * 1024
+
+# sub-requests accepted by the gateway batch and sent at the same time
+GATEWAY_BATCH_MAX = 20
+GATEWAY_BATCH_WORKERS = 8
+
+# seconds the gateway caches the GETs of each route prefix, per query and
+# Authorization, routes not listed are always sent to the module
+GATEWAY_CACHE_TTLS = {
+    'voting/': 2,
+}
+GATEWAY_CACHE_MAX_ENTRIES = 1000
+GATEWAY_CACHE_MAX_BODY = 256 * 1024
+
+# seconds between the visualizer live updates of a voting, shared by all
+# the streams of a process, and between heartbeats of an idle stream
+VISUALIZER_LIVE_INTERVAL = 2
+VISUALIZER_LIVE_HEARTBEAT = 15
+# seconds a live stream is kept open before the browser reconnects. Each
+# open stream holds a worker, the live endpoint needs gthread or async
+# gunicorn workers, with sync workers a few open pages block the site
+VISUALIZER_LIVE_MAX_AGE = 60
+
+# votings per page in the visualizer voting list
+VISUALIZER_PAGE_SIZE = 20
+
 # Versioning
 ALLOWED_VERSIONS = ['v1', 'v2']
 DEFAULT_VERSION = 'v1'
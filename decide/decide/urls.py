@@ -14,6 +14,7 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_swagger.views import get_swagger_view
@@ -41,3 +42,7 @@ for module in settings.MODULES:
     urlpatterns += [
         path('{}/'.format(module), include('{}.urls'.format(module)))
     ]
+
+# the web server serves the bundles in production, this only works with DEBUG
+urlpatterns += static(settings.VOTING_BUNDLE_URL,
+                      document_root=settings.VOTING_BUNDLE_ROOT)
@@ -0,0 +1,88 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.http import parse_etags
+
+
+def route_ttl(submodule, route):
+    '''
+    Seconds a GET of this route is cached, from the longest matching prefix
+    in GATEWAY_CACHE_TTLS. Routes not listed aren't cached.
+    '''
+
+    path = '{}{}'.format(submodule, route)
+    ttl, length = 0, -1
+    for prefix, seconds in settings.GATEWAY_CACHE_TTLS.items():
+        if path.startswith(prefix) and len(prefix) > length:
+            ttl, length = seconds, len(prefix)
+    return ttl
+
+
+def cache_key(submodule, route, query_string, authorization):
+    '''
+    The token is hashed so responses are cached per authorization scope
+    without keeping the tokens.
+    '''
+
+    scope = hashlib.sha1(authorization.encode()).hexdigest() if authorization else ''
+    return (submodule, route, query_string, scope)
+
+
+class CachedResponse:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def response(self, if_none_match=None):
+        etag = self.headers.get('ETag')
+        if etag and if_none_match and etag in parse_etags(if_none_match):
+            response = HttpResponse(status=304)
+            response['ETag'] = etag
+            return response
+
+        response = HttpResponse(self.body, status=self.status)
+        for k, v in self.headers.items():
+            response[k] = v
+        return response
+
+
+class ResponseCache:
+    '''
+    LRU of gateway responses bounded to GATEWAY_CACHE_MAX_ENTRIES, each
+    entry expires after the TTL of its route.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.GATEWAY_CACHE_MAX_ENTRIES:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+responses = ResponseCache()
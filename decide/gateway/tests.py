@@ -1,3 +1,188 @@
-from django.test import TestCase
+import gzip
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APIClient
+
+from base import mods
+from .cache import responses
+from .views import Gateway
+
+
+# the tests of other modules replace mods.query with mods.mock_query in
+# their setUp, this is the one that makes the http calls
+real_query = mods.query
+
+
+class Upstream(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    hits = []
+
+    def reply(self, status, body, content_type, **headers):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in headers.items():
+            self.send_header(k.replace('_', '-'), v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        Upstream.hits.append(self.path)
+        if self.path.startswith('/store/slow/'):
+            time.sleep(0.3)
+        if self.path.startswith('/store/gzip/'):
+            self.reply(200, gzip.compress(b'[1, 2]'), 'application/json',
+                       Content_Encoding='gzip')
+            return
+        if self.path.startswith('/store/login/'):
+            self.reply(200, b'ok', 'text/plain', Set_Cookie='sessionid=victim; Path=/')
+            return
+        if self.path.startswith('/store/cookie/'):
+            self.reply(200, str(self.headers.get('Cookie')).encode(), 'text/plain')
+            return
+        body = '{}|{}|{}'.format(self.path, self.headers.get('Authorization'),
+                                 self.client_address[1]).encode()
+        self.reply(200, body, 'text/plain')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.reply(201, body[::-1], 'application/octet-stream')
+
+    def log_message(self, *args):
+        pass
+
+
+class GatewayTestCase(TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self.apis = self.settings(APIS={'store': url})
+        self.apis.enable()
+        Upstream.hits.clear()
+        responses.clear()
+
+    def tearDown(self):
+        self.apis.disable()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def content(self, response):
+        if response.streaming:
+            return b''.join(response.streaming_content)
+        return response.content
+
+    def test_get(self):
+        response = self.client.get('/gateway/store/list/?voting=1', HTTP_AUTHORIZATION='Token abc')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        path, auth, port = self.content(response).decode().split('|')
+        self.assertEqual((path, auth), ('/store/list/?voting=1', 'Token abc'))
+
+        # the connection is kept in the pool
+        response = self.client.get('/gateway/store/list/')
+        self.assertEqual(self.content(response).decode().split('|')[-1], port)
+
+    def test_upstream_cookies_not_shared(self):
+        response = self.client.get('/gateway/store/login/')
+        self.assertEqual(self.content(response), b'ok')
+
+        other = APIClient()
+        response = other.get('/gateway/store/cookie/')
+        self.assertEqual(self.content(response), b'None')
+
+    def test_batch_timeout(self):
+        calls = [{'module': 'store', 'route': '/slow/'}, {'module': 'store', 'route': '/list/'}]
+        with self.settings(GATEWAY_TIMEOUT=0.1), mock.patch.object(mods, 'query', real_query):
+            response = self.client.post('/gateway/batch/', calls, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        slow, fast = response.json()
+        self.assertEqual(slow, {'status': 504, 'body': None})
+        self.assertEqual(fast['status'], 200)
+        self.assertTrue(fast['body'].startswith('/store/list/|'))
+
+    def test_excluded_modules(self):
+        for url in ('/gateway/base/metrics/', '/gateway/other/', '/gateway/gateway/batch/'):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_post_and_encoding(self):
+        response = self.client.post('/gateway/store/', b'\x00\x01not json',
+                                    content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.content(response), b'nosj ton\x01\x00')
+
+        response = self.client.get('/gateway/store/gzip/')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(self.content(response)), b'[1, 2]')
+
+    def test_upstream_down(self):
+        with self.settings(APIS={'store': 'http://127.0.0.1:1'}):
+            response = self.client.get('/gateway/store/')
+        self.assertEqual(response.status_code, 502)
+
+    def test_cached_get(self):
+        with self.settings(GATEWAY_CACHE_TTLS={'store/list/': 60, 'store/slow/': 60}):
+            first = self.content(self.client.get('/gateway/store/list/?a=1'))
+            self.assertEqual(self.content(self.client.get('/gateway/store/list/?a=1')), first)
+            self.client.get('/gateway/store/list/?a=1', HTTP_AUTHORIZATION='Token abc')
+            self.client.get('/gateway/store/list/?a=2')
+            self.client.get('/gateway/store/other/')
+            self.client.get('/gateway/store/other/')
+            self.assertEqual(len(Upstream.hits), 5)
+
+            # concurrent misses go upstream once
+            factory = RequestFactory()
+            bodies = []
+
+            def get():
+                response = Gateway.as_view()(factory.get('/gateway/store/slow/'),
+                                             submodule='store', route='/slow/')
+                bodies.append(response.content)
+
+            threads = [threading.Thread(target=get) for i in range(5)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(len(set(bodies)), 1)
+            self.assertEqual(len(bodies), 5)
+            self.assertEqual(Upstream.hits.count('/store/slow/'), 1)
+
+
+class GatewayBatchTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        mods.mock_query(self.client)
+
+    def test_batch(self):
+        options = [{ 'option': 'a', 'number': 1, 'votes': 3 }]
+        calls = [
+            { 'module': 'postproc', 'route': '/', 'method': 'post',
+              'body': { 'type': 'IDENTITY', 'options': options } },
+            { 'module': 'postproc', 'route': '/', 'method': 'post',
+              'body': { 'type': 'UNKNOWN' } },
+        ]
+        response = self.client.post('/gateway/batch/', calls, format='json')
+        self.assertEqual(response.status_code, 200)
+        first, second = response.json()
+        self.assertEqual(first, { 'status': 200, 'body': [{ **options[0], 'postproc': 3 }] })
+        self.assertEqual(second['status'], 400)
+
+    def test_batch_invalid(self):
+        for calls in ({}, [{ 'module': 'other', 'route': '/' }],
+                      [{ 'module': 'base', 'route': '/metrics/' }],
+                      [{ 'module': 'postproc', 'route': '/', 'params': ['a'] }],
+                      [{ 'module': 'postproc', 'route': '/', 'method': 'delete' }]):
+            response = self.client.post('/gateway/batch/', calls, format='json')
+            self.assertEqual(response.status_code, 400)
+
+        with self.settings(GATEWAY_BATCH_MAX=1):
+            calls = [{ 'module': 'postproc', 'route': '/' }] * 2
+            response = self.client.post('/gateway/batch/', calls, format='json')
+            self.assertEqual(response.status_code, 400)
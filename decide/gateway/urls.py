@@ -3,5 +3,6 @@ from . import views
 
 
 urlpatterns = [
+    path('batch/', views.GatewayBatch.as_view(), name='gateway_batch'),
     path('<str:submodule><path:route>', views.Gateway.as_view(), name='gateway'),
 ]
@@ -1,18 +1,195 @@
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from base import mods
+import json
+from concurrent.futures import ThreadPoolExecutor
 
+import requests
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from base import mods, tracing
+from base.singleflight import SingleFlight
+from .cache import CachedResponse, cache_key, responses, route_ttl
+
+
+# request headers sent to the module and response headers sent back
+REQUEST_HEADERS = ('Authorization', 'Content-Type', 'If-None-Match', 'Accept')
+RESPONSE_HEADERS = ('Content-Type', 'Content-Encoding', 'Content-Length',
+                    'Content-Disposition', 'ETag', 'Cache-Control', 'Last-Modified')
+
+# modules not reachable through the gateway, its calls come from this host
+EXCLUDED_MODULES = ('base', 'gateway')
+
+
+def proxied(module):
+    return module in settings.MODULES and module not in EXCLUDED_MODULES
+
+
+# concurrent misses of the same cached GET, only one goes upstream
+flights = SingleFlight()
+
+
+def stream_body(resp):
+    '''
+    Upstream body as it comes, without decoding it, closing the response
+    at the end so the connection goes back to the pool.
+    '''
+
+    try:
+        yield from resp.raw.stream(settings.GATEWAY_CHUNK_SIZE, decode_content=False)
+    finally:
+        resp.close()
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class Gateway(View):
+    '''
+    Proxy to the decide modules. The bodies are passed byte for byte in
+    both directions, with the status and the content headers.
+    '''
+
+    http_method_names = ['get', 'post']
+
+    def dispatch(self, request, submodule, route):
+        if not proxied(submodule):
+            raise Http404
+        return super().dispatch(request, submodule, route)
+
+    def proxy(self, request, submodule, route):
+        url = mods.module_url(submodule, route)
+        query_string = request.META.get('QUERY_STRING')
+        if query_string:
+            url += '?' + query_string
+
+        headers = {h: request.headers[h] for h in REQUEST_HEADERS if h in request.headers}
+        tracing.inject(headers)
+        data = request.body if request.method == 'POST' else None
+        try:
+            resp = mods.session().request(request.method, url, data=data, headers=headers,
+                                          stream=True, timeout=settings.GATEWAY_TIMEOUT)
+        except requests.RequestException:
+            return HttpResponse(status=502)
+
+        response = StreamingHttpResponse(stream_body(resp), status=resp.status_code)
+        for h in RESPONSE_HEADERS:
+            if h in resp.headers:
+                response[h] = resp.headers[h]
+        return response
+
+    def fetch(self, request, submodule, route, key, ttl):
+        '''
+        Whole upstream response of a cached GET. It's sent without the
+        conditional headers of this client, the cached response is shared.
+        '''
+
+        url = mods.module_url(submodule, route)
+        if key[2]:
+            url += '?' + key[2]
+        headers = {h: request.headers[h] for h in ('Authorization', 'Accept')
+                   if h in request.headers}
+        tracing.inject(headers)
+        resp = mods.session().get(url, headers=headers, timeout=settings.GATEWAY_TIMEOUT)
+
+        cached = CachedResponse(resp.status_code, {
+            h: resp.headers[h] for h in RESPONSE_HEADERS
+            if h in resp.headers and h not in ('Content-Encoding', 'Content-Length')
+        }, resp.content)
+        if resp.status_code == 200 and len(resp.content) <= settings.GATEWAY_CACHE_MAX_BODY:
+            responses.set(key, cached, ttl)
+        return cached
 
-class Gateway(APIView):
     def get(self, request, submodule, route):
-        kwargs = {'HTTP_AUTHORIZATION': request.META.get('HTTP_AUTHORIZATION', '')}
-        kwargs['params'] = {k: v for k, v in request.data.items()}
-        resp = mods.query(submodule, route, method='get', response=True, **kwargs)
-        return Response(resp.json(), status=resp.status_code)
+        ttl = route_ttl(submodule, route)
+        if not ttl:
+            return self.proxy(request, submodule, route)
+
+        key = cache_key(submodule, route, request.META.get('QUERY_STRING', ''),
+                        request.headers.get('Authorization', ''))
+        cached = responses.get(key)
+        if cached is None:
+            try:
+                cached = flights.do(key, lambda: self.fetch(request, submodule, route, key, ttl))
+            except requests.RequestException:
+                return HttpResponse(status=502)
+        return cached.response(request.headers.get('If-None-Match'))
 
     def post(self, request, submodule, route):
-        kwargs = {'HTTP_AUTHORIZATION': request.META.get('HTTP_AUTHORIZATION', '')}
-        kwargs['json'] = {k: v for k, v in request.data.items()}
+        return self.proxy(request, submodule, route)
+
+
+def batch_call(call, auth):
+    '''
+    One sub-request of a batch as {"status": int, "body": ...}. JSON bodies
+    are put in place without decoding them, others go as a string.
+    '''
+
+    try:
+        resp = mods.query(call['module'], call['route'], method=call['method'],
+                          params=call.get('params'), json=call.get('body', {}),
+                          response=True, HTTP_AUTHORIZATION=auth,
+                          timeout=settings.GATEWAY_TIMEOUT)
+    except requests.Timeout:
+        return b'{"status": 504, "body": null}'
+    except requests.RequestException:
+        return b'{"status": 502, "body": null}'
+
+    body = resp.content
+    if not body:
+        body = b'null'
+    elif 'json' not in resp.headers.get('Content-Type', ''):
+        body = json.dumps(body.decode('utf-8', 'replace')).encode()
+    return b'{"status": %d, "body": %s}' % (resp.status_code, body)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class GatewayBatch(View):
+
+    http_method_names = ['post']
+
+    def post(self, request):
+        """
+         * [
+            {
+             module: str,
+             route: str, starting with /
+             method: get | post / nullable, get by default
+             params: {} / nullable, query params
+             body: {} / nullable, json body of a post
+            }
+           ]
+
+        The sub-requests are sent at the same time, with the Authorization
+        of this request, and the response is the list of their results,
+        [{ status: int, body: ... }] in the same order. A sub-request without
+        a response in GATEWAY_TIMEOUT gets a 504.
+        """
+
+        try:
+            calls = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'detail': 'invalid json'}, status=400)
+        if not isinstance(calls, list) or len(calls) > settings.GATEWAY_BATCH_MAX:
+            return JsonResponse({'detail': 'expected a list of at most {} calls'.format(
+                settings.GATEWAY_BATCH_MAX)}, status=400)
+
+        for call in calls:
+            if not isinstance(call, dict):
+                return JsonResponse({'detail': 'invalid call'}, status=400)
+            call.setdefault('method', 'get')
+            if (not proxied(call.get('module')) or
+                    not str(call.get('route', '')).startswith('/') or
+                    not isinstance(call.get('params') or {}, dict) or
+                    call['method'] not in ('get', 'post')):
+                return JsonResponse({'detail': 'invalid call {}'.format(call)}, status=400)
+
+        auth = request.headers.get('Authorization', '')
+        if len(calls) < 2:
+            results = [batch_call(c, auth) for c in calls]
+        else:
+            workers = min(len(calls), settings.GATEWAY_BATCH_WORKERS)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(tracing.propagate(lambda c: batch_call(c, auth)), calls))
 
-        resp = mods.query(submodule, route, method='post', response=True, **kwargs)
-        return Response(resp.json(), status=resp.status_code)
+        return HttpResponse(b'[' + b', '.join(results) + b']',
+                            content_type='application/json')
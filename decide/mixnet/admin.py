@@ -1,6 +1,15 @@
 from django.contrib import admin
 
-from .models import Mixnet
+from .models import KeyShare, Mixnet, MixnetRun
 
 
 admin.site.register(Mixnet)
+admin.site.register(KeyShare)
+
+
+class MixnetRunAdmin(admin.ModelAdmin):
+    list_display = ('mixnet', 'operation', 'msgs', 'bits', 'seconds', 'created')
+    list_filter = ('operation', 'bits')
+
+
+admin.site.register(MixnetRun, MixnetRunAdmin)
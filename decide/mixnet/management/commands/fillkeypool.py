@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mixnet.models import KeyShare
+
+
+class Command(BaseCommand):
+    help = 'Fill the key share pool of this authority, run it periodically to keep it full'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=settings.KEY_POOL_SIZE,
+                            help='number of shares to keep in the pool')
+        parser.add_argument('--p', type=int, default=0,
+                            help='group prime, use the one of the first authority')
+        parser.add_argument('--g', type=int, default=0,
+                            help='group generator, use the one of the first authority')
+
+    def handle(self, *args, **options):
+        n = KeyShare.fill(options['size'], p=options['p'], g=options['g'])
+        share = KeyShare.objects.filter(bits=settings.KEYBITS).select_related('key').first()
+        print("Generated {} key shares".format(n))
+        if share:
+            print("Group p={} g={}".format(share.key.p, share.key.g))
@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-19 14:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0003_auto_20180921_1119'),
+        ('mixnet', '0004_auto_20180605_0842'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeyShare',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bits', models.PositiveIntegerField()),
+                ('key', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='share', to='base.key')),
+            ],
+        ),
+    ]
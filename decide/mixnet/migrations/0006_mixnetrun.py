@@ -0,0 +1,27 @@
+# Generated by Django 4.1 on 2026-10-19 15:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mixnet', '0005_keyshare'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MixnetRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation', models.CharField(choices=[('shuffle', 'shuffle'), ('decrypt', 'decrypt')], max_length=10)),
+                ('msgs', models.PositiveIntegerField()),
+                ('bits', models.PositiveIntegerField()),
+                ('seconds', models.FloatField()),
+                ('counters', models.JSONField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('mixnet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='mixnet.mixnet')),
+            ],
+        ),
+    ]
@@ -34,6 +34,10 @@ True
 '''
 
 
+import functools
+import threading
+import time
+from contextlib import contextmanager
 from pprint import pprint
 
 from Crypto.PublicKey import ElGamal
@@ -42,6 +46,93 @@ from Crypto import Random
 from Crypto.Util.number import GCD
 
 
+# modular exponentiations and inversions done by each operation itself,
+# the nested operations count their own (reencrypt is an encrypt)
+PRIMITIVES = {
+    'getk': (1, 0),
+    'encrypt': (2, 0),
+    'decrypt': (3, 1),
+}
+
+
+class Counters:
+    '''
+    Number of calls and wall time of each operation by key bits. The time
+    is inclusive, a shuffle time has its reencrypts time.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ops = {}
+
+    def add(self, op, bits, seconds):
+        with self.lock:
+            c = self.ops.setdefault((op, bits), [0, 0.0])
+            c[0] += 1
+            c[1] += seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {k: tuple(v) for k, v in self.ops.items()}
+
+    def summary(self):
+        out = {'modexp': 0, 'inverse': 0, 'ops': {}}
+        for (op, bits), (count, seconds) in self.snapshot().items():
+            o = out['ops'].setdefault(op, {'count': 0, 'seconds': 0})
+            o['count'] += count
+            o['seconds'] += seconds
+            modexp, inverse = PRIMITIVES.get(op, (0, 0))
+            out['modexp'] += modexp * count
+            out['inverse'] += inverse * count
+        return out
+
+
+# all the operations of this process
+counters = Counters()
+
+# callbacks hook(operation, seconds) called after each MixCrypt operation,
+# the operations called inside another one are part of the outer one
+hooks = []
+_local = threading.local()
+
+
+@contextmanager
+def collect():
+    '''
+    Counters of the operations done by this thread inside the block
+    '''
+
+    c = Counters()
+    collectors = _local.__dict__.setdefault('collectors', [])
+    collectors.append(c)
+    try:
+        yield c
+    finally:
+        collectors.remove(c)
+
+
+def timed(fn):
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        outer = not getattr(_local, 'busy', False)
+        _local.busy = True
+        start = time.perf_counter()
+        try:
+            return fn(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            counters.add(name, self.bits, elapsed)
+            for c in getattr(_local, 'collectors', ()):
+                c.add(name, self.bits, elapsed)
+            if outer:
+                _local.busy = False
+                for hook in hooks:
+                    hook(name, elapsed)
+    return wrapper
+
+
 def rand(p):
     while True:
         k = random.StrongRandom().randint(1, int(p) - 1)
@@ -52,10 +143,10 @@ def rand(p):
 def gen_multiple_key(*crypts):
     k1 = crypts[0]
     k = MixCrypt(k=k1.k, bits=k1.bits)
-    k.k.y = 1
+    y = 1
     for kx in crypts:
-        k.k.y *= kx.k.y
-    k.k.y = k.k.y % k.k.p
+        y = (y * int(kx.k.y)) % int(k.k.p)
+    k.k = ElGamal.construct((int(k.k.p), int(k.k.g), y))
     return k
 
 
@@ -104,27 +195,37 @@ def multiple_decrypt_shuffle2(ciphers, *crypts, pubkey=None):
 
 
 class MixCrypt:
-    def __init__(self, k=None, bits=256):
+    def __init__(self, k=None, bits=256, gen=True):
+        '''
+        With gen=False and no k there's no key until getk or setk is
+        called, generating a key is slow and useless if it's replaced.
+        '''
+
         self.bits = bits
+        self.k = None
         if k:
             self.k = self.getk(k.p, k.g)
-        else:
+        elif gen:
             self.k = self.genk()
 
+    @timed
     def genk(self):
         self.k = ElGamal.generate(self.bits, Random.new().read)
         return self.k
 
+    @timed
     def getk(self, p, g):
         x = rand(p)
         y = pow(g, x, p)
         self.k = ElGamal.construct((p, g, y, x))
         return self.k
 
+    @timed
     def setk(self, p, g, y, x):
         self.k = ElGamal.construct((p, g, y, x))
         return self.k
 
+    @timed
     def encrypt(self, m, k=None):
         r = rand(self.k.p)
         if not k:
@@ -132,10 +233,12 @@ class MixCrypt:
         a, b = k._encrypt(m, r)
         return a, b
 
+    @timed
     def decrypt(self, c):
         m = self.k._decrypt(c)
         return m
 
+    @timed
     def multiple_decrypt(self, msgs, last=True):
         msgs2 = []
         for a, b in msgs:
@@ -147,6 +250,7 @@ class MixCrypt:
             msgs2.append(msg)
         return msgs2
 
+    @timed
     def shuffle_decrypt(self, msgs, last=True):
         msgs2 = msgs.copy()
         msgs3 = []
@@ -162,6 +266,7 @@ class MixCrypt:
 
         return msgs3
 
+    @timed
     def reencrypt(self, cipher, pubkey=None):
         '''
         >>> B = 256
@@ -198,6 +303,7 @@ class MixCrypt:
                 x[d] = i
         return x
 
+    @timed
     def shuffle(self, msgs, pubkey=None):
         '''
         Reencrypt and shuffle
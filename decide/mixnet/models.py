@@ -1,8 +1,12 @@
-from django.db import models
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+from django.db import models, transaction
+
+from . import mixcrypt
 from .mixcrypt import MixCrypt
 
-from base import mods
+from base import mods, tracing
 from base.models import Auth, Key
 from base.serializers import AuthSerializer
 from django.conf import settings
@@ -12,6 +16,67 @@ from django.conf import settings
 B = settings.KEYBITS
 
 
+class KeyShare(models.Model):
+    '''
+    Pre-generated key of this authority, waiting in the pool to be claimed
+    by a mixnet. All the shares of the pool use the same group (p, g), so
+    the other authorities can fill their pools with that group too.
+    '''
+
+    key = models.OneToOneField(Key, related_name="share",
+                               on_delete=models.CASCADE)
+    bits = models.PositiveIntegerField()
+
+    def __str__(self):
+        return "{} bits: {}".format(self.bits, self.key)
+
+    @classmethod
+    def claim(cls, p=0, g=0):
+        '''
+        Takes a key out of the pool, for the group (p, g) if given.
+        Returns None when the pool is empty.
+        '''
+
+        shares = cls.objects.filter(bits=B)
+        if p and g:
+            shares = shares.filter(key__p=p, key__g=g)
+
+        with transaction.atomic():
+            share = (shares.select_for_update(skip_locked=True)
+                           .select_related('key').first())
+            if not share:
+                return None
+            share.delete()
+        return share.key
+
+    @classmethod
+    def fill(cls, size, p=0, g=0):
+        '''
+        Generates shares until the pool has size keys. Without (p, g) the
+        group of the pool is used, or a new one if the pool is empty.
+        Returns the number of generated shares.
+        '''
+
+        shares = cls.objects.filter(bits=B)
+        if not (p and g) and shares.exists():
+            key = shares.select_related('key').first().key
+            p, g = key.p, key.g
+
+        crypt = MixCrypt(bits=B, gen=False)
+        n = 0
+        for i in range(size - shares.count()):
+            if p and g:
+                k = crypt.getk(p, g)
+            else:
+                k = crypt.genk()
+                p, g = int(k.p), int(k.g)
+            key = Key(p=int(k.p), g=int(k.g), y=int(k.y), x=int(k.x))
+            key.save()
+            cls(key=key, bits=B).save()
+            n += 1
+        return n
+
+
 class Mixnet(models.Model):
     voting_id = models.PositiveIntegerField()
     auth_position = models.PositiveIntegerField(default=0)
@@ -29,34 +94,56 @@ class Mixnet(models.Model):
                                                           auths, self.pubkey)
 
     def shuffle(self, msgs, pk):
-        crypt = MixCrypt(bits=B)
-        k = crypt.setk(self.key.p, self.key.g, self.key.y, self.key.x)
+        attrs = {'voting': self.voting_id, 'position': self.auth_position, 'msgs': len(msgs)}
+        with tracing.span('mixnet.shuffle', **attrs), mixcrypt.collect() as counters:
+            start = time.perf_counter()
+            with tracing.span('mixnet.setk'):
+                crypt = MixCrypt(bits=B, gen=False)
+                k = crypt.setk(self.key.p, self.key.g, self.key.y, self.key.x)
+
+            with tracing.span('mixnet.reencrypt_shuffle'):
+                out = crypt.shuffle(msgs, pk)
 
-        return crypt.shuffle(msgs, pk)
+        self.save_run('shuffle', len(msgs), time.perf_counter() - start, counters)
+        return out
 
     def decrypt(self, msgs, pk, last=False):
-        crypt = MixCrypt(bits=B)
-        k = crypt.setk(self.key.p, self.key.g, self.key.y, self.key.x)
-        return crypt.shuffle_decrypt(msgs, last)
+        attrs = {'voting': self.voting_id, 'position': self.auth_position,
+                 'msgs': len(msgs), 'last': last}
+        with tracing.span('mixnet.decrypt', **attrs), mixcrypt.collect() as counters:
+            start = time.perf_counter()
+            with tracing.span('mixnet.setk'):
+                crypt = MixCrypt(bits=B, gen=False)
+                k = crypt.setk(self.key.p, self.key.g, self.key.y, self.key.x)
+
+            with tracing.span('mixnet.shuffle_decrypt'):
+                out = crypt.shuffle_decrypt(msgs, last)
+
+        self.save_run('decrypt', len(msgs), time.perf_counter() - start, counters)
+        return out
+
+    def save_run(self, operation, msgs, seconds, counters):
+        MixnetRun.objects.create(mixnet=self, operation=operation, msgs=msgs, bits=B,
+                                 seconds=seconds, counters=counters.summary())
 
     def gen_key(self, p=0, g=0):
-        crypt = MixCrypt(bits=B)
         if self.key:
-            k = crypt.setk(self.key.p, self.key.g, self.key.y, self.key.x)
-        elif (not g or not p):
-            k = crypt.genk()
+            return
+
+        # a share from the pool is ready, generating one here blocks the
+        # voting start, specially without p and g
+        key = KeyShare.claim(p, g)
+        if not key:
+            crypt = MixCrypt(bits=B, gen=False)
+            if (not g or not p):
+                k = crypt.genk()
+            else:
+                k = crypt.getk(p, g)
             key = Key(p=int(k.p), g=int(k.g), y=int(k.y), x=int(k.x))
             key.save()
 
-            self.key = key
-            self.save()
-        else:
-            k = crypt.getk(p, g)
-            key = Key(p=int(k.p), g=int(k.g), y=int(k.y), x=int(k.x))
-            key.save()
-
-            self.key = key
-            self.save()
+        self.key = key
+        self.save()
 
     def chain_call(self, path, data):
         next_auths=self.next_auths()
@@ -75,6 +162,34 @@ class Mixnet(models.Model):
 
         return None
 
+    def fan_out(self, path, data):
+        '''
+        Calls all the next auths at the same time instead of one after
+        another like chain_call. Each auth gets the auths from its position
+        on, like in the chain, and chain=False so it doesn't call the rest.
+        Returns the responses in the auths order.
+        '''
+
+        next_auths = list(self.next_auths())
+        calls = []
+        for i, auth in enumerate(next_auths):
+            d = dict(data)
+            d.update({
+                "auths": AuthSerializer(next_auths[i:], many=True).data,
+                "voting": self.voting_id,
+                "position": self.auth_position + 1 + i,
+                "chain": False,
+            })
+            calls.append((auth.url, d))
+
+        def call(c):
+            return mods.post('mixnet', entry_point=path, baseurl=c[0], json=c[1])
+
+        if len(calls) < 2:
+            return [call(c) for c in calls]
+        with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+            return list(pool.map(tracing.propagate(call), calls))
+
     def next_auths(self):
         next_auths = self.auths.filter(me=False)
 
@@ -82,3 +197,23 @@ class Mixnet(models.Model):
             next_auths = next_auths[1:]
 
         return next_auths
+
+
+class MixnetRun(models.Model):
+    '''
+    Summary of a shuffle or decrypt of this authority: time and MixCrypt
+    counters, to size the authorities and compare key sizes.
+    '''
+
+    mixnet = models.ForeignKey(Mixnet, related_name="runs", on_delete=models.CASCADE)
+    operation = models.CharField(max_length=10,
+                                 choices=[('shuffle', 'shuffle'), ('decrypt', 'decrypt')])
+    msgs = models.PositiveIntegerField()
+    bits = models.PositiveIntegerField()
+    seconds = models.FloatField()
+    counters = models.JSONField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return "Voting {} {}: {} msgs in {:.3f}s".format(self.mixnet.voting_id, self.operation,
+                                                        self.msgs, self.seconds)
@@ -1,10 +1,18 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.conf import settings
 from rest_framework.test import APIClient
 from rest_framework.test import APITestCase
 
 from mixnet.mixcrypt import MixCrypt
 from mixnet.mixcrypt import ElGamal
+from mixnet import mixcrypt
+from mixnet.models import KeyShare, Mixnet, MixnetRun
 
 from base import mods
 
@@ -188,3 +196,130 @@ class MixnetCase(APITestCase):
 
         self.assertNotEqual(clear, clear1)
         self.assertEqual(sorted(clear), sorted(clear1))
+
+    def test_create_from_pool(self):
+        self.assertEqual(KeyShare.fill(2), 2)
+        self.assertEqual(KeyShare.fill(2), 0)
+        share = KeyShare.objects.select_related('key').first()
+        p, g = share.key.p, share.key.g
+
+        data = { "voting": 1, "auths": [ { "name": "auth1", "url": "http://localhost:8000" } ] }
+        response = self.client.post('/mixnet/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        key = response.json()
+        self.assertEqual((key["p"], key["g"]), (p, g))
+        self.assertEqual(KeyShare.objects.count(), 1)
+
+        mn = Mixnet.objects.get(voting_id=1)
+        self.assertEqual(mn.key.y, key["y"])
+        self.assertFalse(KeyShare.objects.filter(key=mn.key).exists())
+
+        # another group isn't in the pool, the key is generated
+        data = {
+            "voting": 2,
+            "auths": [ { "name": "auth1", "url": "http://localhost:8000" } ],
+            "key": { "p": 23, "g": 5 },
+        }
+        response = self.client.post('/mixnet/', data, format='json')
+        self.assertEqual(response.json()["p"], 23)
+        self.assertEqual(KeyShare.objects.count(), 1)
+
+    @override_settings(MIXNET_KEY_FANOUT=True)
+    def test_multiple_auths_fanout(self):
+        data = {
+            "voting": 1,
+            "auths": [
+                { "name": "auth1", "url": "http://localhost:8000" },
+                { "name": "auth2", "url": "http://127.0.0.1:8000" },
+            ]
+        }
+        response = self.client.post('/mixnet/', data, format='json')
+        key = response.json()
+        pk = key["p"], key["g"], key["y"]
+
+        mns = Mixnet.objects.filter(voting_id=1).order_by('auth_position')
+        self.assertEqual([mn.auth_position for mn in mns], [0, 1])
+        self.assertEqual(pk[2], (mns[0].key.y * mns[1].key.y) % pk[0])
+
+        clear = [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]
+        encrypt = self.encrypt_msgs(clear, pk)
+
+        data = { "msgs": encrypt, "pk": key }
+        response = self.client.post('/mixnet/shuffle/1/', data, format='json')
+        shuffled = response.json()
+
+        data = { "msgs": shuffled, "pk": key }
+        response = self.client.post('/mixnet/decrypt/1/', data, format='json')
+        self.assertEqual(sorted(clear), sorted(response.json()))
+
+    def test_shuffle_spans(self):
+        self.test_create()
+        pk = self.key["p"], self.key["g"], self.key["y"]
+        data = { "msgs": self.encrypt_msgs([2, 3, 4], pk) }
+        trace_id = 'a' * 32
+        traceparent = '00-{}-{}-01'.format(trace_id, 'b' * 16)
+
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'traces.jsonl')
+            with self.settings(TRACE_EXPORTER='file', TRACE_FILE=path):
+                response = self.client.post('/mixnet/shuffle/1/', data, format='json',
+                                            HTTP_TRACEPARENT=traceparent)
+            self.assertEqual(response.status_code, 200)
+
+            with open(path) as f:
+                spans = {s['name']: s for s in map(json.loads, f)}
+            self.assertEqual({s['trace_id'] for s in spans.values()}, {trace_id})
+            request = spans['POST /mixnet/shuffle/1/']
+            self.assertEqual(request['parent_id'], 'b' * 16)
+            self.assertEqual(spans['mixnet.shuffle']['parent_id'], request['span_id'])
+            self.assertEqual(spans['mixnet.shuffle']['attrs']['msgs'], 3)
+            self.assertEqual(spans['mixnet.reencrypt_shuffle']['parent_id'],
+                             spans['mixnet.shuffle']['span_id'])
+
+            out = io.StringIO()
+            call_command('tracewaterfall', trace_id, file=[path], stdout=out)
+            lines = out.getvalue().splitlines()
+            self.assertIn('POST /mixnet/shuffle/1/', lines[1])
+            self.assertIn('    mixnet.setk', lines[3])
+
+    def test_server_timing(self):
+        self.test_create()
+        pk = self.key["p"], self.key["g"], self.key["y"]
+        data = { "msgs": self.encrypt_msgs([2, 3, 4], pk) }
+
+        with self.settings(SERVER_TIMING_LOG_SAMPLE=1), self.assertLogs('base.timing') as logs:
+            response = self.client.post('/mixnet/shuffle/1/', data, format='json')
+        timing = dict(v.split(';', 1) for v in response['Server-Timing'].split(', '))
+        self.assertEqual(list(timing), ['db', 'mods', 'crypto', 'total'])
+        self.assertIn('desc="0 calls"', timing['mods'])
+        # setk and shuffle, the reencrypts are inside the shuffle
+        self.assertIn('desc="2 ops"', timing['crypto'])
+        self.assertNotIn('desc="0 queries"', timing['db'])
+        self.assertIn('POST /mixnet/shuffle/1/ 200', logs.output[0])
+
+    def test_run_counters(self):
+        self.test_create()
+        pk = self.key["p"], self.key["g"], self.key["y"]
+        before = mixcrypt.counters.summary()
+        data = { "msgs": self.encrypt_msgs([2, 3, 4], pk) }
+        response = self.client.post('/mixnet/shuffle/1/', data, format='json')
+        data = { "msgs": response.json() }
+        response = self.client.post('/mixnet/decrypt/1/', data, format='json')
+        self.assertEqual(sorted(response.json()), [2, 3, 4])
+
+        shuffle, decrypt = MixnetRun.objects.order_by('id')
+        self.assertEqual((shuffle.operation, shuffle.msgs, shuffle.bits),
+                         ('shuffle', 3, settings.KEYBITS))
+        self.assertEqual(shuffle.counters['ops']['reencrypt']['count'], 3)
+        self.assertEqual(shuffle.counters['ops']['encrypt']['count'], 3)
+        self.assertEqual(shuffle.counters['modexp'], 6)
+        self.assertEqual(decrypt.counters['ops']['decrypt']['count'], 3)
+        self.assertEqual((decrypt.counters['modexp'], decrypt.counters['inverse']), (9, 3))
+
+        # the process counters have them too
+        after = mixcrypt.counters.summary()
+        self.assertEqual(after['inverse'] - before['inverse'], 3)
+        with self.settings(METRICS_TOKEN='s3cret'):
+            response = self.client.get('/base/metrics/', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertIn('decide_mixcrypt_operations_total{op="shuffle",bits="%d"}'
+                      % settings.KEYBITS, response.content.decode())
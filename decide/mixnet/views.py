@@ -24,12 +24,14 @@ class MixnetViewSet(viewsets.ModelViewSet):
          * voting: id
          * position: int / nullable
          * key: { "p": int, "g": int } / nullable
+         * chain: bool / nullable, false to only create this auth key
         """
 
         auths = request.data.get("auths")
         voting = request.data.get("voting")
         key = request.data.get("key", {"p": 0, "g": 0})
         position = request.data.get("position", 0)
+        chain = request.data.get("chain", True)
         p, g = int(key["p"]), int(key["g"])
 
         dbauths = []
@@ -49,12 +51,18 @@ class MixnetViewSet(viewsets.ModelViewSet):
         mn.gen_key(p, g)
 
         data = { "key": { "p": mn.key.p, "g": mn.key.g } }
-        # chained call to the next auth to gen the key
-        resp = mn.chain_call("/", data)
-        if resp:
-            y = (resp["y"] * mn.key.y) % mn.key.p
+        y = mn.key.y
+        if not chain:
+            pass
+        elif settings.MIXNET_KEY_FANOUT:
+            # all the next auths gen their key at the same time
+            for resp in mn.fan_out("/", data):
+                y = (resp["y"] * y) % mn.key.p
         else:
-            y = mn.key.y
+            # chained call to the next auth to gen the key
+            resp = mn.chain_call("/", data)
+            if resp:
+                y = (resp["y"] * mn.key.y) % mn.key.p
 
         pubkey = Key(p=mn.key.p, g=mn.key.g, y=y)
         pubkey.save()
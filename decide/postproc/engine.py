@@ -0,0 +1,112 @@
+'''
+Post-processing methods. Each one takes the options of a question, as
+{option, number, votes, ...extraparams}, and the question params, and
+returns the options with the "postproc" value ordered by it.
+'''
+
+import heapq
+from itertools import zip_longest
+
+
+class PostProcError(ValueError):
+    pass
+
+
+def ranked(out):
+    out.sort(key=lambda x: -x['postproc'])
+    return out
+
+
+def identity(options, **params):
+    return ranked([{**opt, 'postproc': opt['votes']} for opt in options])
+
+
+def weight(options, **params):
+    '''
+    The votes of each option multiplied by its "weight" extraparam
+    '''
+
+    return ranked([{**opt, 'postproc': opt['votes'] * opt.get('weight', 1)}
+                   for opt in options])
+
+
+def equality(options, **params):
+    '''
+    Zipper list: the options are ranked by votes inside their "group"
+    extraparam and then the groups alternate, starting with the group of
+    the most voted option. postproc is the final position.
+    '''
+
+    groups = {}
+    for opt in sorted(options, key=lambda x: -x['votes']):
+        groups.setdefault(opt.get('group'), []).append(opt)
+
+    out = []
+    for row in zip_longest(*groups.values()):
+        out.extend(opt for opt in row if opt is not None)
+
+    n = len(out)
+    return [{**opt, 'postproc': n - i} for i, opt in enumerate(out)]
+
+
+def highest_averages(options, seats, divisor, threshold=0):
+    '''
+    Seat allocation by highest averages. A heap keeps the next quotient of
+    each option, so every seat is a pop and a push: O(seats * log options).
+    Ties go to the option with more votes, then to the lower number.
+    '''
+
+    if not isinstance(seats, int) or seats < 0:
+        raise PostProcError('seats must be a positive integer')
+
+    total = sum(opt['votes'] for opt in options)
+    heap = []
+    for i, opt in enumerate(options):
+        votes = opt['votes']
+        if votes > 0 and votes >= total * threshold:
+            heap.append((-votes / divisor(0), -votes, opt['number'], i))
+    heapq.heapify(heap)
+
+    won = [0] * len(options)
+    for _ in range(seats):
+        if not heap:
+            break
+        _, votes, number, i = heapq.heappop(heap)
+        won[i] += 1
+        heapq.heappush(heap, (votes / divisor(won[i]), votes, number, i))
+
+    out = [{**opt, 'postproc': won[i]} for i, opt in enumerate(options)]
+    out.sort(key=lambda x: (-x['postproc'], -x['votes']))
+    return out
+
+
+def dhondt(options, seats=0, threshold=0, **params):
+    return highest_averages(options, seats, lambda s: s + 1, threshold)
+
+
+def sainte_lague(options, seats=0, threshold=0, **params):
+    return highest_averages(options, seats, lambda s: 2 * s + 1, threshold)
+
+
+METHODS = {
+    'IDENTITY': identity,
+    'WEIGHT': weight,
+    'EQUALITY': equality,
+    'DHONDT': dhondt,
+    'SAINTE_LAGUE': sainte_lague,
+}
+
+
+def postproc(type='IDENTITY', options=(), **params):
+    method = METHODS.get(type)
+    if method is None:
+        raise PostProcError('unknown type {}'.format(type))
+    return method(list(options), **params)
+
+
+def postproc_many(questions):
+    '''
+    Post-processes several questions in one call
+    '''
+
+    return [postproc(**q) for q in questions]
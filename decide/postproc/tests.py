@@ -42,3 +42,56 @@ class PostProcTestCase(APITestCase):
 
         values = response.json()
         self.assertEqual(values, expected_result)
+
+    def seats(self, data):
+        response = self.client.post('/postproc/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return {opt['option']: opt['postproc'] for opt in response.json()}
+
+    def council_options(self):
+        return [
+            { 'option': 'A', 'number': 1, 'votes': 100000 },
+            { 'option': 'B', 'number': 2, 'votes': 80000 },
+            { 'option': 'C', 'number': 3, 'votes': 30000 },
+            { 'option': 'D', 'number': 4, 'votes': 20000 },
+        ]
+
+    def test_dhondt(self):
+        data = { 'type': 'DHONDT', 'seats': 8, 'options': self.council_options() }
+        self.assertEqual(self.seats(data), { 'A': 4, 'B': 3, 'C': 1, 'D': 0 })
+
+        data['threshold'] = 0.15
+        self.assertEqual(self.seats(data), { 'A': 5, 'B': 3, 'C': 0, 'D': 0 })
+
+    def test_sainte_lague(self):
+        data = { 'type': 'SAINTE_LAGUE', 'seats': 8, 'options': self.council_options() }
+        self.assertEqual(self.seats(data), { 'A': 3, 'B': 3, 'C': 1, 'D': 1 })
+
+    def test_weight_and_equality(self):
+        options = [
+            { 'option': 'a1', 'number': 1, 'votes': 10, 'weight': 1, 'group': 'a' },
+            { 'option': 'a2', 'number': 2, 'votes': 8, 'weight': 3, 'group': 'a' },
+            { 'option': 'b1', 'number': 3, 'votes': 5, 'weight': 2, 'group': 'b' },
+        ]
+        self.assertEqual(self.seats({ 'type': 'WEIGHT', 'options': options }),
+                         { 'a1': 10, 'a2': 24, 'b1': 10 })
+
+        response = self.client.post('/postproc/', { 'type': 'EQUALITY', 'options': options },
+                                    format='json')
+        self.assertEqual([opt['option'] for opt in response.json()], ['a1', 'b1', 'a2'])
+
+    def test_many_questions(self):
+        data = {
+            'questions': [
+                { 'type': 'DHONDT', 'seats': 2, 'options': self.council_options() },
+                { 'type': 'IDENTITY', 'options': self.council_options() },
+            ]
+        }
+        response = self.client.post('/postproc/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        first, second = response.json()
+        self.assertEqual([opt['postproc'] for opt in first], [1, 1, 0, 0])
+        self.assertEqual(second[0]['postproc'], 100000)
+
+        response = self.client.post('/postproc/', { 'type': 'UNKNOWN' }, format='json')
+        self.assertEqual(response.status_code, 400)
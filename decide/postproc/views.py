@@ -1,38 +1,36 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.status import HTTP_400_BAD_REQUEST as ST_400
 
+from . import engine
 
-class PostProcView(APIView):
-
-    def identity(self, options):
-        out = []
 
-        for opt in options:
-            out.append({
-                **opt,
-                'postproc': opt['votes'],
-            });
-
-        out.sort(key=lambda x: -x['postproc'])
-        return Response(out)
+class PostProcView(APIView):
 
     def post(self, request):
         """
-         * type: IDENTITY | EQUALITY | WEIGHT
+         * type: IDENTITY | EQUALITY | WEIGHT | DHONDT | SAINTE_LAGUE
+         * seats: int, for DHONDT and SAINTE_LAGUE
+         * threshold: float / nullable, minimum fraction of the votes to get seats
          * options: [
             {
              option: str,
              number: int,
              votes: int,
+             weight: number / nullable, for WEIGHT
+             group: str / nullable, for EQUALITY
              ...extraparams
             }
            ]
-        """
-
-        t = request.data.get('type', 'IDENTITY')
-        opts = request.data.get('options', [])
 
-        if t == 'IDENTITY':
-            return self.identity(opts)
+        Several questions can be post-processed at once sending
+         * questions: [ { type, seats, threshold, options } ]
+        and the response is the list of results in the same order.
+        """
 
-        return Response({})
+        try:
+            if 'questions' in request.data:
+                return Response(engine.postproc_many(request.data['questions']))
+            return Response(engine.postproc(**request.data))
+        except (engine.PostProcError, KeyError, TypeError) as e:
+            return Response({'detail': str(e)}, status=ST_400)
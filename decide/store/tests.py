@@ -1,5 +1,7 @@
 import datetime
+import os
 import random
+import tempfile
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.test import TestCase
@@ -8,6 +10,7 @@ from rest_framework.test import APITestCase
 
 from .models import Vote
 from .serializers import VoteSerializer
+from . import turnout
 from base import mods
 from base.models import Auth
 from base.tests import BaseTestCase
@@ -73,4 +76,59 @@ class StoreTextCase(BaseTestCase):
             "vote": { "a": 1, "b": 1 }
         }
         response = self.client.post('/store/', data, format='json')
-        self.assertEqual(response.status_code, 401)
\ No newline at end of file
+        self.assertEqual(response.status_code, 401)
+
+    def test_turnout(self):
+        with tempfile.TemporaryDirectory() as root, self.settings(TURNOUT_ROOT=root):
+            self.assertEqual(turnout.turnout(self.voting.id), 0)
+            self.assertFalse(os.path.exists(turnout.turnout_path(self.voting.id)))
+
+            self.assertTrue(turnout.mark(self.voting.id, 3))
+            self.assertTrue(turnout.mark(self.voting.id, 1000))
+            self.assertFalse(turnout.mark(self.voting.id, 3))
+            self.assertTrue(turnout.has_voted(self.voting.id, 1000))
+            self.assertFalse(turnout.has_voted(self.voting.id, 4))
+            self.assertFalse(turnout.has_voted(self.voting.id, 5000))
+            self.assertEqual(turnout.turnout(self.voting.id), 2)
+
+            # a lost file is rebuilt from the stored votes
+            for voter in (3, 7, 9):
+                Vote.objects.create(voting_id=self.voting.id, voter_id=voter, a=1, b=1)
+            os.unlink(turnout.turnout_path(self.voting.id))
+            self.assertEqual(turnout.turnout(self.voting.id), 3)
+            self.assertTrue(turnout.has_voted(self.voting.id, 7))
+            self.assertFalse(turnout.has_voted(self.voting.id, 1000))
+
+            response = self.client.get('/store/turnout/{}/'.format(self.voting.id))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {'voting': self.voting.id, 'turnout': 3})
+
+            url = '/store/turnout/{}/?voter_id=9'.format(self.voting.id)
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 401)
+            self.login()
+            response = self.client.get(url)
+            self.assertEqual(response.json()['voted'], True)
+
+    def test_closed_voting_with_cached_body(self):
+        user = self.get_or_create_user(10)
+        census = Census.objects.create(name='store census')
+        census.users.add(user)
+        self.voting.census = census
+        self.voting.save()
+        self.login(user=user.username)
+        data = {'voting': self.voting.id, 'voter': user.id, 'vote': {'a': 1, 'b': 2}}
+        response = self.client.post('/store/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        # the voting is closed without invalidating its cached body, like
+        # from another process with its own cache
+        response = self.client.get('/voting/?id={}'.format(self.voting.id))
+        self.assertIsNone(response.json()[0]['end_date'])
+        Voting.objects.filter(pk=self.voting.id).update(
+            end_date=timezone.now() - datetime.timedelta(minutes=1))
+        response = self.client.get('/voting/?id={}'.format(self.voting.id))
+        self.assertIsNone(response.json()[0]['end_date'])
+
+        response = self.client.post('/store/', data, format='json')
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,112 @@
+import fcntl
+import os
+import struct
+import tempfile
+
+from django.conf import settings
+
+from .models import Vote
+
+
+# the file starts with the number of voters, then a bitmap with the bit
+# voter_id set for each voter that has voted
+HEADER = struct.Struct('<Q')
+
+
+def turnout_path(voting_id):
+    return os.path.join(settings.TURNOUT_ROOT, 'turnout-{}.bin'.format(voting_id))
+
+
+def _bitmap(voter_ids):
+    bitmap = bytearray()
+    count = 0
+    for uid in voter_ids:
+        byte = uid >> 3
+        if byte >= len(bitmap):
+            bitmap.extend(bytes(byte + 1 - len(bitmap)))
+        if not bitmap[byte] & (1 << (uid & 7)):
+            bitmap[byte] |= 1 << (uid & 7)
+            count += 1
+    return HEADER.pack(count) + bitmap
+
+
+def _open(voting_id, create=False):
+    '''
+    Opens the turnout file of a voting, building it from the stored votes if
+    it doesn't exist. os.link fails if another process created it first, so
+    a file with marked votes is never replaced.
+
+    Returns None if there's no file nor votes and create is False.
+    '''
+
+    path = turnout_path(voting_id)
+    try:
+        return os.open(path, os.O_RDWR)
+    except FileNotFoundError:
+        pass
+
+    votes = Vote.objects.filter(voting_id=voting_id)
+    if not create and not votes.exists():
+        return None
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # a unique name, the threads of a process can build it at the same time
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    voter_ids = votes.values_list('voter_id', flat=True)
+    with open(fd, 'wb') as f:
+        f.write(_bitmap(voter_ids.iterator()))
+    try:
+        os.link(tmp, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp)
+    return os.open(path, os.O_RDWR)
+
+
+def mark(voting_id, voter_id):
+    '''
+    Sets the voter as voted, returns False if it had already voted
+    '''
+
+    fd = _open(voting_id, create=True)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        offset = HEADER.size + (voter_id >> 3)
+        byte = os.pread(fd, 1, offset)
+        byte = byte[0] if byte else 0
+        bit = 1 << (voter_id & 7)
+        if byte & bit:
+            return False
+        count, = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+        os.pwrite(fd, bytes([byte | bit]), offset)
+        os.pwrite(fd, HEADER.pack(count + 1), 0)
+        return True
+    finally:
+        os.close(fd)
+
+
+def has_voted(voting_id, voter_id):
+    fd = _open(voting_id)
+    if fd is None:
+        return False
+    try:
+        byte = os.pread(fd, 1, HEADER.size + (voter_id >> 3))
+    finally:
+        os.close(fd)
+    return bool(byte) and bool(byte[0] & (1 << (voter_id & 7)))
+
+
+def turnout(voting_id):
+    '''
+    Number of voters that have voted
+    '''
+
+    fd = _open(voting_id)
+    if fd is None:
+        return 0
+    try:
+        count, = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+    finally:
+        os.close(fd)
+    return count
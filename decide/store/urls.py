@@ -4,4 +4,5 @@ from . import views
 
 urlpatterns = [
     path('', views.StoreView.as_view(), name='store'),
+    path('turnout/<int:voting_id>/', views.TurnoutView.as_view(), name='turnout'),
 ]
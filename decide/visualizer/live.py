@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+
+from django.conf import settings
+
+from base import mods
+from census.models import Census
+from voting.models import Voting
+
+
+def snapshot(voting_id):
+    '''
+    Public state of a voting: the turnout while it's open and the
+    post-processed result once it's tallied. None if it doesn't exist.
+    '''
+
+    voting = Voting.objects.filter(pk=voting_id).values(
+        'start_date', 'end_date', 'postproc', 'census').first()
+    if voting is None:
+        return None
+
+    state = {
+        'voting': voting_id,
+        'started': voting['start_date'] is not None,
+        'closed': voting['end_date'] is not None,
+    }
+    if voting['postproc']:
+        state['postproc'] = voting['postproc']
+        return state
+
+    state['census'] = 0
+    if voting['census']:
+        state['census'] = Census.users.through.objects.filter(
+            census_id=voting['census']).count()
+    state['turnout'] = 0
+    if state['started']:
+        if mods.is_local('store'):
+            from store import turnout
+            state['turnout'] = turnout.turnout(voting_id)
+        else:
+            r = mods.get('store', entry_point='/turnout/{}/'.format(voting_id))
+            state['turnout'] = r['turnout']
+    return state
+
+
+class Feed:
+    '''
+    Latest state of a voting shared by all the streams of this process. The
+    first stream that finds it older than VISUALIZER_LIVE_INTERVAL refreshes
+    it and the others wait for the new state, so N observers cost one
+    snapshot per interval.
+    '''
+
+    def __init__(self, voting_id):
+        self.voting_id = voting_id
+        self.cond = threading.Condition()
+        self.state = None
+        self.version = 0
+        self.updated = None
+        self.refreshing = False
+
+    def refresh(self):
+        state = self.state
+        try:
+            state = snapshot(self.voting_id)
+        finally:
+            with self.cond:
+                self.refreshing = False
+                self.updated = time.monotonic()
+                if state != self.state:
+                    self.state = state
+                    self.version += 1
+                self.cond.notify_all()
+
+    def wait(self, version, timeout):
+        '''
+        Returns the version and state newer than version, or the same
+        version and None when nothing changed before the timeout.
+        '''
+
+        interval = settings.VISUALIZER_LIVE_INTERVAL
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.cond:
+                if self.version > version:
+                    return self.version, self.state
+
+                now = time.monotonic()
+                if now >= deadline:
+                    return version, None
+
+                stale = self.updated is None or now - self.updated >= interval
+                if self.refreshing or not stale:
+                    until = deadline
+                    if not self.refreshing:
+                        until = min(deadline, self.updated + interval)
+                    self.cond.wait(until - now)
+                    continue
+                self.refreshing = True
+
+            self.refresh()
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+def get_feed(voting_id):
+    with _feeds_lock:
+        feed = _feeds.get(voting_id)
+        if feed is None:
+            feed = _feeds[voting_id] = Feed(voting_id)
+        return feed
+
+
+def event(name, data):
+    return 'event: {}\ndata: {}\n\n'.format(name, json.dumps(data))
+
+
+def stream(voting_id):
+    '''
+    Server-Sent Events of a voting: "turnout" events while it's open and
+    a last "results" event when it's tallied. Comments are sent as
+    heartbeat so proxies don't close an idle stream.
+
+    A stream holds a worker while it's open, so it ends after
+    VISUALIZER_LIVE_MAX_AGE seconds and the browser reconnects after the
+    retry time.
+    '''
+
+    feed = get_feed(voting_id)
+    version = 0
+    deadline = time.monotonic() + settings.VISUALIZER_LIVE_MAX_AGE
+    yield 'retry: {}\n\n'.format(settings.VISUALIZER_LIVE_INTERVAL * 1000)
+    while True:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            return
+        timeout = min(settings.VISUALIZER_LIVE_HEARTBEAT, left)
+        new_version, state = feed.wait(version, timeout)
+        if state is None and new_version != version:
+            # the voting was deleted
+            return
+        version = new_version
+        if state is None:
+            yield ': ping\n\n'
+        elif 'postproc' in state:
+            yield event('results', state)
+            return
+        else:
+            yield event('turnout', state)
@@ -1,3 +1,96 @@
-from django.test import TestCase
+import json
+import tempfile
+import time
 
-# Create your tests here.
+from django.utils import timezone
+
+from base.tests import BaseTestCase
+from store import turnout
+from voting.models import Question, Voting
+from . import live
+
+
+class VisualizerLiveTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        live._feeds.clear()
+        self.voting = Voting.objects.create(name='live voting',
+                                            question=Question.objects.create(desc='q'),
+                                            start_date=timezone.now())
+
+    def read_event(self, stream):
+        lines = next(stream).strip().split('\n')
+        return lines[0].replace('event: ', ''), json.loads(lines[1].replace('data: ', ''))
+
+    def test_live_turnout(self):
+        with tempfile.TemporaryDirectory() as root, self.settings(
+                TURNOUT_ROOT=root, VISUALIZER_LIVE_INTERVAL=60,
+                VISUALIZER_LIVE_HEARTBEAT=0.1):
+            turnout.mark(self.voting.id, 3)
+            turnout.mark(self.voting.id, 4)
+
+            response = self.client.get('/visualizer/{}/live/'.format(self.voting.id))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            stream1 = iter(response.streaming_content)
+            self.assertTrue(next(stream1).startswith(b'retry:'))
+            stream2 = live.stream(self.voting.id)
+            next(stream2)
+
+            name, state = self.read_event(map(bytes.decode, stream1))
+            self.assertEqual(name, 'turnout')
+            self.assertEqual(state['turnout'], 2)
+
+            # the second stream gets the same state without querying it
+            with self.assertNumQueries(0):
+                self.assertEqual(self.read_event(stream2), (name, state))
+            self.assertEqual(next(stream2), ': ping\n\n')
+
+    def test_live_max_age(self):
+        with self.settings(VISUALIZER_LIVE_MAX_AGE=0.3, VISUALIZER_LIVE_HEARTBEAT=0.1):
+            stream = live.stream(self.voting.id)
+            self.assertTrue(next(stream).startswith('retry:'))
+            start = time.monotonic()
+            events = list(stream)
+            self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(self.read_event(iter(events))[0], 'turnout')
+        self.assertIn(': ping\n\n', events)
+
+    def test_live_results(self):
+        self.voting.end_date = timezone.now()
+        self.voting.postproc = [{'option': 'a', 'number': 1, 'votes': 1, 'postproc': 1}]
+        self.voting.save()
+
+        stream = live.stream(self.voting.id)
+        next(stream)
+        name, state = self.read_event(stream)
+        self.assertEqual(name, 'results')
+        self.assertEqual(state['postproc'], self.voting.postproc)
+        self.assertRaises(StopIteration, next, stream)
+
+        response = self.client.get('/visualizer/0/live/')
+        self.assertEqual(response.status_code, 404)
+
+
+class ListarVotacionTestCase(BaseTestCase):
+
+    def test_list_pages(self):
+        question = Question.objects.create(desc='q')
+        votings = [Voting.objects.create(name='voting {}'.format(i), question=question)
+                   for i in range(3)]
+
+        with self.settings(VISUALIZER_PAGE_SIZE=2):
+            response = self.client.get('/visualizer/verVotaciones/')
+            self.assertEqual(list(response.context['votaciones']), votings[:0:-1])
+            self.assertContains(response, 'voting 2')
+
+            response = self.client.get('/visualizer/verVotaciones/?page=2')
+            self.assertEqual(list(response.context['votaciones']), votings[:1])
+
+            # the cached row is rendered again when the voting changes
+            votings[2].name = 'renamed voting'
+            votings[2].save()
+            response = self.client.get('/visualizer/verVotaciones/')
+            self.assertContains(response, 'renamed voting')
+            self.assertNotContains(response, 'voting 2')
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import VisualizerView, listarVotacion
+from .views import VisualizerView, VisualizerLiveView, listarVotacion
 
 
 urlpatterns = [
     path('<int:voting_id>/', VisualizerView.as_view(), name="Visualizar"),
+    path('<int:voting_id>/live/', VisualizerLiveView.as_view(), name="visualizer_live"),
     path('verVotaciones/',listarVotacion,name="VerVotaciones")
 ]
@@ -1,11 +1,16 @@
 import json
+from django.views import View
 from django.views.generic import TemplateView
 from django.conf import settings
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
+from voting.cache import voting_versions
 from voting.models import Voting
+from django.core.paginator import Paginator
 from django.shortcuts import render
+from django.urls import reverse
 
 from base import mods
+from . import live
 
 
 class VisualizerView(TemplateView):
@@ -21,10 +26,38 @@ class VisualizerView(TemplateView):
         except:
             raise Http404
 
+        context['live_url'] = reverse('visualizer_live', args=[vid])
         return context
 
 
-def listarVotacion(request):
-    votacion = Voting.objects.all()
+class VisualizerLiveView(View):
+
+    def get(self, request, voting_id):
+        if not Voting.objects.filter(pk=voting_id).exists():
+            raise Http404
 
-    return render(request, "visualizer/verVoto.html", {"votaciones":votacion})
+        response = StreamingHttpResponse(live.stream(voting_id),
+                                         content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # nginx buffers the responses by default
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+def listarVotacion(request):
+    '''
+    Votings in pages of VISUALIZER_PAGE_SIZE, each row is a template
+    fragment cached with the voting cache version, so saving a voting
+    renders its row again.
+    '''
+
+    votaciones = Voting.objects.select_related('question').order_by('-id')
+    page = Paginator(votaciones, settings.VISUALIZER_PAGE_SIZE).get_page(request.GET.get('page'))
+    versions = voting_versions([v.id for v in page])
+    for v in page:
+        v.cache_version = versions[v.id]
+
+    return render(request, "visualizer/verVoto.html", {
+        "votaciones": page,
+        "row_timeout": settings.VOTING_CACHE_TIMEOUT,
+    })
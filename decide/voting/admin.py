@@ -6,6 +6,7 @@ from .models import Question
 from .models import Voting
 
 from .filters import StartedFilter
+from census.index import build_voting_index
 
 
 def start(modeladmin, request, queryset):
@@ -13,6 +14,8 @@ def start(modeladmin, request, queryset):
         v.create_pubkey()
         v.start_date = timezone.now()
         v.save()
+        v.publish_bundle()
+        build_voting_index(v)
 
 
 def stop(ModelAdmin, request, queryset):
@@ -38,7 +41,7 @@ class QuestionAdmin(admin.ModelAdmin):
 class VotingAdmin(admin.ModelAdmin):
     list_display = ('name', 'start_date', 'end_date')
     readonly_fields = ('start_date', 'end_date', 'pub_key',
-                       'tally', 'postproc')
+                       'tally', 'postproc', 'bundle')
     date_hierarchy = 'start_date'
     list_filter = (StartedFilter,)
     search_fields = ('name', )
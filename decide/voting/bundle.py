@@ -0,0 +1,62 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+bundle_storage = FileSystemStorage(location=settings.VOTING_BUNDLE_ROOT,
+                                   base_url=settings.VOTING_BUNDLE_URL)
+
+
+@receiver(setting_changed)
+def bundle_root_changed(setting, value, **kwargs):
+    # the tests move the bundles to a temporary directory
+    if setting == 'VOTING_BUNDLE_ROOT':
+        bundle_storage._location = value
+        bundle_storage.__dict__.pop('base_location', None)
+        bundle_storage.__dict__.pop('location', None)
+
+
+def build_bundle(voting):
+    '''
+    Everything the booth needs to render a voting. Numbers of the public key
+    are strings to manage them in javascript with BigInt.
+    '''
+
+    question = voting.question
+    pub_key = None
+    if voting.pub_key:
+        pub_key = {k: str(getattr(voting.pub_key, k)) for k in ('p', 'g', 'y')}
+
+    return {
+        'id': voting.id,
+        'name': voting.name,
+        'desc': voting.desc,
+        'question': {
+            'desc': question.desc,
+            'options': [{'number': opt.number, 'option': opt.option}
+                        for opt in question.options.order_by('number')],
+        },
+        'pub_key': pub_key,
+        'KEYBITS': settings.KEYBITS,
+    }
+
+
+def write_bundle(voting):
+    '''
+    Writes the voting bundle to the bundle storage and returns its name.
+
+    The name has the content hash so a published file never changes and can
+    be served with far future cache headers.
+    '''
+
+    content = json.dumps(build_bundle(voting), sort_keys=True).encode()
+    digest = hashlib.sha1(content).hexdigest()[:16]
+    name = 'voting-{}-{}.json'.format(voting.id, digest)
+    if not bundle_storage.exists(name):
+        bundle_storage.save(name, ContentFile(content))
+    return name
@@ -0,0 +1,60 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _version_key(voting_id):
+    return 'voting-version-{}'.format(voting_id)
+
+
+def _body_key(voting_id, api_version):
+    return 'voting-body-{}-{}'.format(voting_id, api_version)
+
+
+def voting_version(voting_id):
+    '''
+    Current cache version of a voting. It's a random token instead of a
+    counter so an evicted version never matches a stale body.
+    '''
+
+    return cache.get_or_set(_version_key(voting_id), uuid.uuid4().hex, None)
+
+
+def voting_versions(voting_ids):
+    '''
+    Cache versions of several votings with one cache round trip
+    '''
+
+    keys = {_version_key(vid): vid for vid in voting_ids}
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def invalidate_voting(voting_id):
+    cache.set(_version_key(voting_id), uuid.uuid4().hex, None)
+
+
+def make_etag(body):
+    return '"{}"'.format(hashlib.sha1(body).hexdigest())
+
+
+def get_voting_body(voting_id, api_version):
+    '''
+    Returns the cached (body, etag) for this voting or None
+    '''
+
+    return cache.get(_body_key(voting_id, api_version),
+                     version=voting_version(voting_id))
+
+
+def set_voting_body(voting_id, api_version, body):
+    etag = make_etag(body)
+    cache.set(_body_key(voting_id, api_version), (body, etag),
+              settings.VOTING_CACHE_TIMEOUT, version=voting_version(voting_id))
+    return body, etag
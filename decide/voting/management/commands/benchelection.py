@@ -0,0 +1,258 @@
+import json
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from base.models import Auth, Key
+from census import index as census_index
+from census.models import Census
+from mixnet.mixcrypt import ElGamal, MixCrypt
+from mixnet.models import Mixnet
+from postproc import engine as postproc_engine
+from store import turnout
+from store.models import Vote
+from voting.models import Voting, Question, QuestionOption
+
+
+def current_rss():
+    '''
+    Resident memory of the process in bytes, None where there's no /proc
+    '''
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss():
+    # kilobytes in linux, bytes in macos
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Phase:
+    def __init__(self, name, items):
+        self.name = name
+        self.items = items
+        self.seconds = 0
+        # resident memory grown in the phase, and the peak of the process
+        # since it started, ru_maxrss never goes down
+        self.rss_delta = None
+        self.process_peak_rss = 0
+        self.peak_alloc = None
+
+
+class Command(BaseCommand):
+    help = ('Benchmark a whole election in-process against the configured database: key '
+            'generation, census load, vote ingest, shuffle, decrypt and postproc')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--voters', type=int, default=1000)
+        parser.add_argument('--options', type=int, default=5)
+        parser.add_argument('--auths', type=int, default=1)
+        parser.add_argument('--bits', type=int, default=settings.KEYBITS,
+                            help='key bits, generating keys of 1024 bits or more is slow')
+        parser.add_argument('--seed', type=int, default=1, help='seed of the cast votes')
+        parser.add_argument('--tracemalloc', action='store_true',
+                            help='peak of the python allocations per phase, it slows down the run')
+        parser.add_argument('--json', help='file to write the results')
+        parser.add_argument('--keep', action='store_true',
+                            help='keep the election in the database, it is rolled back by default')
+
+    def phase(self, name, items, fn):
+        self.stdout.write('{}...'.format(name), ending='')
+        self.stdout.flush()
+        phase = Phase(name, items)
+        if self.tracemalloc:
+            tracemalloc.reset_peak()
+        rss = current_rss()
+        start = time.perf_counter()
+        result = fn()
+        phase.seconds = time.perf_counter() - start
+        if self.tracemalloc:
+            phase.peak_alloc = tracemalloc.get_traced_memory()[1]
+        if rss is not None:
+            phase.rss_delta = current_rss() - rss
+        phase.process_peak_rss = peak_rss()
+        self.phases.append(phase)
+        self.stdout.write(' {:.3f}s'.format(phase.seconds))
+        return result
+
+    def gen_keys(self, voting, auths, bits):
+        '''
+        The first authority generates the group and the others their keys
+        in it, like in the chained call. The voting key is the product.
+        '''
+
+        mixnets = []
+        p = g = 0
+        y = 1
+        for i, auth in enumerate(auths):
+            crypt = MixCrypt(bits=bits, gen=False)
+            k = crypt.getk(p, g) if p else crypt.genk()
+            p, g = int(k.p), int(k.g)
+            key = Key.objects.create(p=p, g=g, y=int(k.y), x=int(k.x))
+            mn = Mixnet.objects.create(voting_id=voting.id, auth_position=i, key=key)
+            mn.auths.set(auths)
+            mixnets.append(mn)
+            y = (y * int(k.y)) % p
+
+        voting.pub_key = Key.objects.create(p=p, g=g, y=y)
+        voting.save()
+        return mixnets
+
+    def load_census(self, voting, n, run):
+        users = User.objects.bulk_create(
+            [User(username='bench-{}-{}'.format(run, i)) for i in range(n)],
+            batch_size=settings.CENSUS_BATCH_SIZE)
+        if not users or users[0].pk is None:
+            users = User.objects.filter(username__startswith='bench-{}-'.format(run))
+        voter_ids = [u.pk for u in users]
+
+        census = Census.objects.create(name='bench {}'.format(run))
+        Through = Census.users.through
+        size = settings.CENSUS_BATCH_SIZE
+        for i in range(0, len(voter_ids), size):
+            Through.objects.bulk_create([Through(census_id=census.id, user_id=uid)
+                                         for uid in voter_ids[i:i + size]])
+        voting.census = census
+        voting.start_date = timezone.now()
+        voting.save()
+        census_index.build_voting_index(voting)
+        return voter_ids
+
+    def cast(self, voting, voter_ids, options, seed):
+        '''
+        The voters encrypt their votes, it's the booth work
+        '''
+
+        rnd = random.Random(seed)
+        pk = voting.pub_key
+        crypt = MixCrypt(gen=False)
+        crypt.k = ElGamal.construct((int(pk.p), int(pk.g), int(pk.y)))
+        ballots = []
+        for uid in voter_ids:
+            choice = rnd.choice(options)
+            ballots.append((uid, choice, crypt.encrypt(choice)))
+        return ballots
+
+    def ingest(self, voting, ballots):
+        '''
+        What StoreView does for each vote once the voter is authenticated
+        '''
+
+        for uid, choice, (a, b) in ballots:
+            if not census_index.is_member(voting.id, uid):
+                raise RuntimeError('voter {} not in census'.format(uid))
+            v, _ = Vote.objects.get_or_create(voting_id=voting.id, voter_id=uid,
+                                              defaults={'a': a, 'b': b})
+            v.a, v.b = a, b
+            v.save()
+            turnout.mark(voting.id, uid)
+
+    def shuffle(self, voting, mixnets):
+        pk = voting.pub_key
+        msgs = [[int(a), int(b)] for a, b in
+                Vote.objects.filter(voting_id=voting.id).values_list('a', 'b')]
+        for mn in mixnets:
+            msgs = mn.shuffle(msgs, (pk.p, pk.g, pk.y))
+        return msgs
+
+    def decrypt(self, voting, mixnets, msgs):
+        pk = voting.pub_key
+        for i, mn in enumerate(mixnets):
+            msgs = mn.decrypt(msgs, (pk.p, pk.g, pk.y), last=i == len(mixnets) - 1)
+        voting.tally = msgs
+        voting.end_date = timezone.now()
+        voting.save()
+        return msgs
+
+    def postproc(self, voting):
+        counts = Counter(voting.tally)
+        opts = [{'option': o.option, 'number': o.number, 'votes': counts[o.number]}
+                for o in voting.question.options.all()]
+        voting.postproc = postproc_engine.postproc('IDENTITY', opts)
+        voting.save()
+
+    def run(self, o):
+        run = int(time.time() * 1000)
+        n = o['voters']
+
+        q = Question.objects.create(desc='benchmark question')
+        QuestionOption.objects.bulk_create([
+            QuestionOption(question=q, number=i + 1, option='option {}'.format(i + 1))
+            for i in range(o['options'])])
+        voting = Voting.objects.create(name='benchmark {}'.format(run), question=q)
+        auths = [Auth.objects.create(name='bench auth {}'.format(i), me=i == 0,
+                                     url='http://auth{}.bench'.format(i))
+                 for i in range(o['auths'])]
+        voting.auths.set(auths)
+
+        mixnets = self.phase('key generation', o['auths'],
+                             lambda: self.gen_keys(voting, auths, o['bits']))
+        voter_ids = self.phase('census load', n, lambda: self.load_census(voting, n, run))
+        options = list(range(1, o['options'] + 1))
+        ballots = self.phase('vote encryption (booth)', n,
+                             lambda: self.cast(voting, voter_ids, options, o['seed']))
+        self.phase('vote ingest', n, lambda: self.ingest(voting, ballots))
+        msgs = self.phase('shuffle', n * o['auths'], lambda: self.shuffle(voting, mixnets))
+        self.phase('decrypt', n * o['auths'], lambda: self.decrypt(voting, mixnets, msgs))
+        self.phase('postproc', 1, lambda: self.postproc(voting))
+
+        emitted = Counter(choice for uid, choice, c in ballots)
+        if Counter(voting.tally) != emitted:
+            raise RuntimeError('the tally does not match the emitted votes')
+        return voting
+
+    def report(self, o):
+        self.stdout.write('\n{:<25} {:>10} {:>10} {:>12} {:>10} {:>20}'.format(
+            'phase', 'items', 'seconds', 'items/s', 'RSS +MB', 'process peak RSS MB'))
+        for p in self.phases:
+            rate = p.items / p.seconds if p.seconds else 0
+            delta = '-' if p.rss_delta is None else '{:.1f}'.format(p.rss_delta / 2 ** 20)
+            self.stdout.write('{:<25} {:>10} {:>10.3f} {:>12.1f} {:>10} {:>20.1f}'.format(
+                p.name, p.items, p.seconds, rate, delta, p.process_peak_rss / 2 ** 20))
+            if p.peak_alloc is not None:
+                self.stdout.write('{:<25} python allocations peak {:.1f} MB'.format(
+                    '', p.peak_alloc / 2 ** 20))
+
+        if o['json']:
+            params = {k: o[k] for k in ('voters', 'options', 'auths', 'bits', 'seed')}
+            with open(o['json'], 'w') as f:
+                json.dump({
+                    'date': timezone.now().isoformat(),
+                    'database': settings.DATABASES['default']['ENGINE'],
+                    'params': params,
+                    'phases': [p.__dict__ for p in self.phases],
+                }, f, indent=2)
+            self.stdout.write('\nResults written to {}'.format(o['json']))
+
+    def handle(self, *args, **options):
+        self.phases = []
+        self.tracemalloc = options['tracemalloc']
+        if self.tracemalloc:
+            tracemalloc.start()
+
+        # the index and turnout files of the run don't go with the real ones
+        with tempfile.TemporaryDirectory() as root, override_settings(
+                CENSUS_INDEX_ROOT=root, TURNOUT_ROOT=root):
+            with transaction.atomic():
+                voting = self.run(options)
+                transaction.set_rollback(not options['keep'])
+
+        self.report(options)
+        if options['keep']:
+            self.stdout.write('Voting {} kept'.format(voting.id))
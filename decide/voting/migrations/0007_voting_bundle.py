@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-19 14:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0006_alter_voting_census'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voting',
+            name='bundle',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+    ]
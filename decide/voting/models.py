@@ -1,12 +1,17 @@
+from collections import Counter
+
 from django.db import models
 from django.db.models import JSONField
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
-from base import mods
+from base import mods, tracing
 from base.models import Auth, Key
 
 from census.models import Census
+from postproc import engine as postproc_engine
+from .bundle import write_bundle
+from .cache import invalidate_voting
 
 class Question(models.Model):
     desc = models.TextField()
@@ -44,6 +49,9 @@ class Voting(models.Model):
     tally = JSONField(blank=True, null=True)
     postproc = JSONField(blank=True, null=True)
 
+    # name of the published booth bundle in the bundle storage
+    bundle = models.CharField(max_length=200, blank=True, null=True)
+
     def create_pubkey(self):
         if self.pub_key or not self.auths.count():
             return
@@ -59,6 +67,13 @@ class Voting(models.Model):
         self.pub_key = pk
         self.save()
 
+    def publish_bundle(self):
+        # the booth can't work without the key, it's published once there's one
+        if not self.pub_key:
+            return
+        self.bundle = write_bundle(self)
+        self.save()
+
     def get_votes(self, token=''):
         # gettings votes from store
         votes = mods.get('store', params={'voting_id': self.id}, HTTP_AUTHORIZATION='Token ' + token)
@@ -80,56 +95,84 @@ class Voting(models.Model):
         The tally is a shuffle and then a decrypt
         '''
 
-        votes = self.get_votes(token)
+        with tracing.span('voting.tally', voting=self.id):
+            votes = self.get_votes(token)
 
-        auth = self.auths.first()
-        shuffle_url = "/shuffle/{}/".format(self.id)
-        decrypt_url = "/decrypt/{}/".format(self.id)
-        auths = [{"name": a.name, "url": a.url} for a in self.auths.all()]
-
-        # first, we do the shuffle
-        data = { "msgs": votes }
-        response = mods.post('mixnet', entry_point=shuffle_url, baseurl=auth.url, json=data,
-                response=True)
-        if response.status_code != 200:
-            # TODO: manage error
-            pass
-
-        # then, we can decrypt that
-        data = {"msgs": response.json()}
-        response = mods.post('mixnet', entry_point=decrypt_url, baseurl=auth.url, json=data,
-                response=True)
-
-        if response.status_code != 200:
-            # TODO: manage error
-            pass
-
-        self.tally = response.json()
-        self.save()
+            auth = self.auths.first()
+            shuffle_url = "/shuffle/{}/".format(self.id)
+            decrypt_url = "/decrypt/{}/".format(self.id)
+            auths = [{"name": a.name, "url": a.url} for a in self.auths.all()]
+
+            # first, we do the shuffle
+            data = { "msgs": votes }
+            response = mods.post('mixnet', entry_point=shuffle_url, baseurl=auth.url, json=data,
+                    response=True)
+            if response.status_code != 200:
+                # TODO: manage error
+                pass
+
+            # then, we can decrypt that
+            data = {"msgs": response.json()}
+            response = mods.post('mixnet', entry_point=decrypt_url, baseurl=auth.url, json=data,
+                    response=True)
+
+            if response.status_code != 200:
+                # TODO: manage error
+                pass
 
-        self.do_postproc()
+            self.tally = response.json()
+            self.save()
+
+            self.do_postproc()
 
     def do_postproc(self):
         tally = self.tally
         options = self.question.options.all()
+        counts = Counter(tally) if isinstance(tally, list) else Counter()
 
         opts = []
         for opt in options:
-            if isinstance(tally, list):
-                votes = tally.count(opt.number)
-            else:
-                votes = 0
             opts.append({
                 'option': opt.option,
                 'number': opt.number,
-                'votes': votes
+                'votes': counts[opt.number]
             })
 
         data = { 'type': 'IDENTITY', 'options': opts }
-        postp = mods.post('postproc', json=data)
+        if mods.is_local('postproc'):
+            postp = postproc_engine.postproc(**data)
+        else:
+            postp = mods.post('postproc', json=data)
 
         self.postproc = postp
         self.save()
 
     def __str__(self):
         return self.name
+
+
+@receiver(post_save, sender=Voting)
+@receiver(post_delete, sender=Voting)
+def voting_changed(sender, instance, **kwargs):
+    invalidate_voting(instance.id)
+
+
+@receiver(post_save, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    for voting_id in instance.voting.values_list('id', flat=True):
+        invalidate_voting(voting_id)
+
+
+@receiver(post_save, sender=QuestionOption)
+@receiver(post_delete, sender=QuestionOption)
+def question_option_changed(sender, instance, **kwargs):
+    # by question_id, the question can be deleted already in a cascade
+    votings = Voting.objects.filter(question_id=instance.question_id)
+    for voting_id in votings.values_list('id', flat=True):
+        invalidate_voting(voting_id)
+
+
+@receiver(m2m_changed, sender=Voting.auths.through)
+def voting_auths_changed(sender, instance, action, **kwargs):
+    if action.startswith('post_') and isinstance(instance, Voting):
+        invalidate_voting(instance.id)
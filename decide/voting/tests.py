@@ -1,7 +1,10 @@
 import random
 import itertools
+import tempfile
+from unittest import mock
 from django.utils import timezone
 from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
 from django.contrib.auth.models import User
 from django.contrib.staticfiles.testing import StaticLiveServerTestCase
 from django.test import TestCase
@@ -19,7 +22,8 @@ from base.tests import BaseTestCase
 from census.models import Census
 from mixnet.mixcrypt import ElGamal
 from mixnet.mixcrypt import MixCrypt
-from mixnet.models import Auth
+from mixnet.models import Auth, Key
+from voting import cache as voting_cache
 from voting.models import Voting, Question, QuestionOption
 from datetime import datetime
 
@@ -185,6 +189,111 @@ class VotingTestCase(BaseTestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.json(), 'Voting already tallied')
 
+    def create_votings_with_key(self, n):
+        for i in range(n):
+            v = self.create_voting()
+            v.pub_key = Key.objects.create(p=23, g=5, y=8)
+            v.save()
+
+    def test_voting_list_num_queries(self):
+        self.create_votings_with_key(2)
+        # voting + question + pub_key, options, auths
+        with self.assertNumQueries(3):
+            response = self.client.get('/voting/', format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+        self.create_votings_with_key(4)
+        with self.assertNumQueries(3):
+            response = self.client.get('/voting/', format='json')
+        self.assertEqual(len(response.json()), 6)
+        self.assertEqual(len(response.json()[0]['question']['options']), 5)
+        self.assertEqual(response.json()[0]['pub_key']['y'], 8)
+
+    def test_voting_list_v2_num_queries(self):
+        self.create_votings_with_key(6)
+        # voting + question, options
+        with self.assertNumQueries(2):
+            response = self.client.get('/voting/?version=v2', format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 6)
+        self.assertNotIn('pub_key', response.json()[0])
+
+
+    def test_voting_etag(self):
+        voting = self.create_voting()
+        url = '/voting/?id={}'.format(voting.pk)
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(response.json()[0]['id'], voting.pk)
+
+        # cached body, no queries at all
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+        # the v2 body is cached apart
+        response = self.client.get(url + '&version=v2', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('pub_key', response.json()[0])
+
+        # saving the voting invalidates the cached body
+        voting.start_date = timezone.now()
+        voting.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertTrue(response.json()[0]['start_date'])
+
+        # and so do the changes of its options
+        etag = response['ETag']
+        QuestionOption(question=voting.question, option='option 6').save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()[0]['question']['options']), 6)
+
+        etag = response['ETag']
+        voting.question.options.first().delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()[0]['question']['options']), 5)
+
+    def test_voting_cache_shared(self):
+        # two processes with the same cache backend, one of them saves the voting
+        with tempfile.TemporaryDirectory() as root:
+            worker1, worker2 = FileBasedCache(root, {}), FileBasedCache(root, {})
+            with mock.patch.object(voting_cache, 'cache', worker1):
+                voting_cache.set_voting_body(1, 'v1', b'[]')
+                self.assertEqual(voting_cache.get_voting_body(1, 'v1')[0], b'[]')
+            with mock.patch.object(voting_cache, 'cache', worker2):
+                voting_cache.invalidate_voting(1)
+            with mock.patch.object(voting_cache, 'cache', worker1):
+                self.assertIsNone(voting_cache.get_voting_body(1, 'v1'))
+
+    def test_postproc_in_process(self):
+        voting = self.create_voting()
+        numbers = [opt.number for opt in voting.question.options.all()]
+        voting.tally = [numbers[0]] * 3 + [numbers[2]]
+
+        # postproc runs in this deployment, there's no request to it
+        with mock.patch.object(mods, 'post', side_effect=AssertionError):
+            voting.do_postproc()
+        self.assertEqual([(o['number'], o['postproc']) for o in voting.postproc[:2]],
+                         [(numbers[0], 3), (numbers[2], 1)])
+
+        with self.settings(APIS={'postproc': 'http://postproc.example'}):
+            with mock.patch.object(mods, 'post', return_value=[]) as post:
+                voting.do_postproc()
+        post.assert_called_once()
+        self.assertEqual(voting.postproc, [])
+
+
 class LogInSuccessTests(StaticLiveServerTestCase):
 
     def setUp(self):
@@ -1,13 +1,18 @@
 import django_filters.rest_framework
 from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
 from django.utils import timezone
+from django.utils.http import parse_etags
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from .cache import get_voting_body, set_voting_body
 from .models import Question, QuestionOption, Voting
 from .serializers import SimpleVotingSerializer, VotingSerializer
 from base.perms import UserIsStaff
+from census.index import build_voting_index
 from base.models import Auth
 
 
@@ -17,16 +22,44 @@ class VotingView(generics.ListCreateAPIView):
     filter_backends = (django_filters.rest_framework.DjangoFilterBackend,)
     filterset_fields = ('id', )
 
+    def get_queryset(self):
+        # every nested serializer field is loaded here, so listing votings
+        # costs a fixed number of queries whatever the number of rows
+        if self.serializer_class is SimpleVotingSerializer:
+            return (Voting.objects.select_related('question')
+                                  .prefetch_related('question__options'))
+        return (Voting.objects.select_related('question', 'pub_key')
+                              .prefetch_related('question__options', 'auths'))
+
     def get(self, request, *args, **kwargs):
         idpath = kwargs.get('voting_id')
-        self.queryset = Voting.objects.all()
         version = request.version
         if version not in settings.ALLOWED_VERSIONS:
             version = settings.DEFAULT_VERSION
         if version == 'v2':
             self.serializer_class = SimpleVotingSerializer
 
-        return super().get(request, *args, **kwargs)
+        vid = request.query_params.get('id', '')
+        cacheable = (vid.isdigit() and
+                     set(request.query_params) <= {'id', 'version'} and
+                     request.accepted_renderer.format == 'json')
+        if not cacheable:
+            return super().get(request, *args, **kwargs)
+
+        cached = get_voting_body(vid, version)
+        if cached:
+            body, etag = cached
+        else:
+            queryset = self.filter_queryset(self.get_queryset())
+            data = self.get_serializer(queryset, many=True).data
+            body, etag = set_voting_body(vid, version, JSONRenderer().render(data))
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        return response
 
     def post(self, request, *args, **kwargs):
         self.permission_classes = (UserIsStaff,)
@@ -72,6 +105,8 @@ class VotingUpdate(generics.RetrieveUpdateDestroyAPIView):
             else:
                 voting.start_date = timezone.now()
                 voting.save()
+                voting.publish_bundle()
+                build_voting_index(voting)
                 msg = 'Voting started'
         elif action == 'stop':
             if not voting.start_date:
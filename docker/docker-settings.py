@@ -13,8 +13,19 @@ DATABASES = {
 
 STATIC_ROOT = '/app/static/'
 MEDIA_ROOT = '/app/static/media/'
+VOTING_BUNDLE_ROOT = '/app/static/bundles/'
+VOTING_BUNDLE_URL = '/static/bundles/'
 ALLOWED_HOSTS = ['*']
 
+# shared by the gunicorn workers, so a voting invalidated in one of them is
+# invalidated in all. The table is created with ./manage.py createcachetable
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'decide_cache',
+    }
+}
+
 CSRF_TRUSTED_ORIGINS = ['http://10.5.0.1:8000', 'http://localhost:8000']
 
 # Modules in use, commented modules that you won't use
@@ -0,0 +1,188 @@
+"""
+Micro-benchmarks of the mixnet crypto core (decide/mixnet/mixcrypt.py).
+
+Each row is an operation over a number of ballots with a key size, the
+results are written as json to compare runs over time:
+
+    $ python bench_mixcrypt.py --bits 256 1024 --ballots 1000 -o results.json
+    $ python bench_mixcrypt.py --bits 256 1024 --ballots 1000 --compare results.json
+
+The keys and the ballots come from a seeded generator, so every run works
+on the same data. The groups use a random prime instead of a safe prime,
+generating safe primes of 2048 bits or more takes too long and the cost of
+the operations only depends on the size of p. The random values MixCrypt
+uses inside the operations come from the OS and can't be seeded.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'decide'))
+
+import Crypto
+from Crypto.PublicKey import ElGamal
+from Crypto.Util.number import getPrime
+
+from mixnet.mixcrypt import MixCrypt, gen_multiple_key, multiple_decrypt_shuffle2
+
+
+BITS = [256, 512, 1024, 2048, 3072]
+BALLOTS = [1000, 10000, 100000]
+OPS = ['encrypt', 'reencrypt', 'decrypt', 'shuffle', 'shuffle_decrypt',
+       'gen_multiple_key', 'multiple_decrypt_shuffle2']
+
+
+def randbytes(rnd):
+    '''
+    randfunc of pycryptodome from a seeded random.Random, Random.randbytes
+    is only in python 3.9 or later
+    '''
+
+    # getrandbits(0) fails before python 3.9
+    return lambda n: rnd.getrandbits(8 * n).to_bytes(n, 'big') if n else b''
+
+
+def seeded_crypts(bits, auths, rnd):
+    '''
+    MixCrypt of each authority sharing a seeded group, and the joint key
+    '''
+
+    p = getPrime(bits, randfunc=randbytes(rnd))
+    g = 2
+    crypts = []
+    for i in range(auths):
+        x = rnd.randrange(2, p - 1)
+        crypt = MixCrypt(bits=bits, gen=False)
+        crypt.setk(p, g, pow(g, x, p), x)
+        crypts.append(crypt)
+
+    joint = MixCrypt(bits=bits, gen=False)
+    y = 1
+    for crypt in crypts:
+        y = (y * int(crypt.k.y)) % p
+    joint.k = ElGamal.construct((p, g, y))
+    return crypts, joint
+
+
+def prepare(op, bits, ballots, auths, seed):
+    '''
+    Returns the function to time, the inputs are built out of the timing
+    '''
+
+    rnd = random.Random('{}-{}-{}'.format(seed, bits, ballots))
+    crypts, joint = seeded_crypts(bits, auths, rnd)
+    crypt = crypts[0]
+    clears = [rnd.randrange(2, 1000) for i in range(ballots)]
+    pk = (int(joint.k.p), int(joint.k.g), int(joint.k.y))
+
+    if op == 'encrypt':
+        return lambda: [crypt.encrypt(m) for m in clears]
+    if op == 'gen_multiple_key':
+        return lambda: gen_multiple_key(*crypts)
+
+    if op == 'multiple_decrypt_shuffle2':
+        ciphers = [joint.encrypt(m) for m in clears]
+        return lambda: multiple_decrypt_shuffle2(ciphers, *crypts, pubkey=pk)
+
+    ciphers = [crypt.encrypt(m) for m in clears]
+    if op == 'reencrypt':
+        return lambda: [crypt.reencrypt(c) for c in ciphers]
+    if op == 'decrypt':
+        return lambda: [crypt.decrypt(c) for c in ciphers]
+    if op == 'shuffle':
+        return lambda: crypt.shuffle(ciphers)
+    if op == 'shuffle_decrypt':
+        return lambda: crypt.shuffle_decrypt(ciphers)
+    raise ValueError(op)
+
+
+def bench(op, bits, ballots, auths, repeat, seed):
+    fn = prepare(op, bits, ballots, auths, seed)
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    best = min(times)
+    items = 1 if op == 'gen_multiple_key' else ballots
+    return {
+        'op': op,
+        'bits': bits,
+        'ballots': None if op == 'gen_multiple_key' else ballots,
+        'auths': auths,
+        'repeat': repeat,
+        'min': best,
+        'median': statistics.median(times),
+        'per_item_us': best / items * 1e6,
+        'items_per_s': items / best if best else None,
+    }
+
+
+def row_key(row):
+    return (row['op'], row['bits'], row['ballots'], row['auths'])
+
+
+def compare(results, path):
+    with open(path) as f:
+        baseline = {row_key(r): r for r in json.load(f)['results']}
+
+    print('\n{:<26} {:>5} {:>7} {:>12} {:>12} {:>8}'.format(
+        'op', 'bits', 'ballots', 'baseline s', 'now s', 'speedup'))
+    for row in results:
+        old = baseline.get(row_key(row))
+        if not old:
+            continue
+        print('{:<26} {:>5} {:>7} {:>12.4f} {:>12.4f} {:>7.2f}x'.format(
+            row['op'], row['bits'], row['ballots'] or '-', old['min'], row['min'],
+            old['min'] / row['min'] if row['min'] else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MixCrypt micro-benchmarks')
+    parser.add_argument('--bits', type=int, nargs='+', default=BITS)
+    parser.add_argument('--ballots', type=int, nargs='+', default=BALLOTS)
+    parser.add_argument('--ops', nargs='+', default=OPS, choices=OPS)
+    parser.add_argument('--auths', type=int, default=3,
+                        help='authorities of gen_multiple_key and multiple_decrypt_shuffle2')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('-o', '--output', default='bench_mixcrypt.json')
+    parser.add_argument('--compare', help='previous results to compare with')
+    args = parser.parse_args()
+
+    results = []
+    for bits in args.bits:
+        for op in args.ops:
+            for ballots in args.ballots:
+                row = bench(op, bits, ballots, args.auths, args.repeat, args.seed)
+                results.append(row)
+                print('{:<26} {:>5} bits {:>7} ballots {:>10.4f} s {:>10.1f} us/item'.format(
+                    op, bits, row['ballots'] or '-', row['min'], row['per_item_us']))
+                if op == 'gen_multiple_key':
+                    break
+
+    out = {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seed': args.seed,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pycryptodome': Crypto.__version__,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(out, f, indent=2)
+    print('\nResults written to {}'.format(args.output))
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
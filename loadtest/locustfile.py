@@ -1,34 +1,135 @@
+"""
+Load test scenarios of a whole election:
+
+* Booth: voters opening the booth and loading the voting.
+* Voters: login, getuser and store with a vote encrypted with the voting key.
+* Visualizer: polling the visualizer and the turnout while the voting is open.
+* Tally: staff users stopping and tallying the voting at the same time.
+
+The configuration comes from environment variables, so a run can be
+repeated headless:
+
+    $ DECIDE_VOTING=3 DECIDE_PROFILE=ramp locust --headless Booth Voters Visualizer Tally
+
+DECIDE_PROFILE is one of PROFILES, without it the users and spawn rate are
+the ones of the command line. When the run ends the percentiles of each
+request are written as json to DECIDE_SUMMARY, and compared with the ones
+of DECIDE_COMPARE when it's set.
+"""
+
 import json
+import os
+import random
+import re
+import time
 
 from bs4 import BeautifulSoup
-from random import choice
 
 from locust import (
     HttpUser,
+    LoadTestShape,
     SequentialTaskSet,
     TaskSet,
+    events,
     task,
     between
 )
+from locust.exception import StopUser
 
 
-HOST = "http://localhost:8000"
-VOTING = 1
+HOST = os.environ.get('DECIDE_HOST', 'http://localhost:8000')
+VOTING = int(os.environ.get('DECIDE_VOTING', 1))
+ADMIN = os.environ.get('DECIDE_ADMIN', 'admin')
+ADMIN_PASS = os.environ.get('DECIDE_ADMIN_PASS', 'admin')
+VOTERS = os.environ.get('DECIDE_VOTERS', 'voters.json')
+SEED = int(os.environ.get('DECIDE_SEED', 1))
+# seconds from the start before the Tally users stop the voting
+TALLY_AFTER = int(os.environ.get('DECIDE_TALLY_AFTER', 120))
+TALLY_USERS = int(os.environ.get('DECIDE_TALLY_USERS', 2))
+PROFILE = os.environ.get('DECIDE_PROFILE')
+SUMMARY = os.environ.get('DECIDE_SUMMARY', 'summary.json')
+COMPARE = os.environ.get('DECIDE_COMPARE')
 
+PERCENTILES = (0.5, 0.75, 0.9, 0.95, 0.99, 0.999)
 
-class DefVisualizer(TaskSet):
+# (end second, users, spawn rate) of each stage
+PROFILES = {
+    'smoke': [(30, 5, 1)],
+    'ramp': [(60, 25, 1), (180, 100, 2), (300, 100, 2), (330, 0, 10)],
+    'spike': [(30, 10, 5), (60, 200, 50), (120, 200, 50), (150, 10, 50)],
+    'soak': [(120, 50, 1), (1800, 50, 1)],
+}
+
+# locust picks the tasks with random, with the seed two runs do the same
+random.seed(SEED)
+
+state = {'start': time.time(), 'closed': False, 'voters': None}
+
+
+def next_voter():
+    '''
+    Every user votes with a different voter of the voters file while there
+    are voters left, the order is the same in every run
+    '''
+
+    if state['voters'] is None:
+        with open(VOTERS) as f:
+            voters = sorted(json.loads(f.read()).items())
+        random.Random(SEED).shuffle(voters)
+        state['voters'] = voters
+    if not state['voters']:
+        return None
+    return state['voters'].pop()
+
+
+def encrypt(pub_key, m, rnd):
+    '''
+    ElGamal encryption of the option number m, like the booth does
+    '''
+
+    p, g, y = int(pub_key['p']), int(pub_key['g']), int(pub_key['y'])
+    k = rnd.randrange(1, p - 1)
+    return {'a': str(pow(g, k, p)), 'b': str((m * pow(y, k, p)) % p)}
+
+
+def get_voting(client):
+    r = client.get('/voting/?id={}'.format(VOTING), name='/voting/?id=[id]')
+    voting = r.json()
+    return voting[0] if voting else None
+
+
+class DefBooth(TaskSet):
 
     @task
+    def booth(self):
+        r = self.client.get('/booth/{}/'.format(VOTING), name='/booth/[id]/')
+        # a started voting is loaded from its published bundle
+        bundle = re.search(r'fetch\("([^"]+)"\)', r.text)
+        if bundle:
+            self.client.get(bundle.group(1), name='[bundle]')
+        else:
+            get_voting(self.client)
+
+
+class DefVisualizer(TaskSet):
+
+    @task(1)
     def index(self):
-        self.client.get("/visualizer/{0}/".format(VOTING))
+        self.client.get("/visualizer/{0}/".format(VOTING), name='/visualizer/[id]/')
+
+    @task(4)
+    def turnout(self):
+        self.client.get('/store/turnout/{}/'.format(VOTING), name='/store/turnout/[id]/')
 
 
 class DefVoters(SequentialTaskSet):
 
     def on_start(self):
-        with open('voters.json') as f:
-            self.voters = json.loads(f.read())
-        self.voter = choice(list(self.voters.items()))
+        self.voter = next_voter()
+        if not self.voter:
+            raise StopUser()
+        self.rnd = random.Random('{}-{}'.format(SEED, self.voter[0]))
+        self.voting = get_voting(self.client)
 
     @task
     def login(self):
@@ -40,8 +141,7 @@ class DefVoters(SequentialTaskSet):
 
     @task
     def getuser(self):
-        self.usr= self.client.post("/authentication/getuser/", self.token).json()
-        print( str(self.user))
+        self.usr = self.client.post("/authentication/getuser/", self.token).json()
 
     @task
     def voting(self):
@@ -49,22 +149,64 @@ class DefVoters(SequentialTaskSet):
             'Authorization': 'Token ' + self.token.get('token'),
             'content-type': 'application/json'
         }
-        self.client.post("/store/", json.dumps({
+        option = self.rnd.choice(self.voting['question']['options'])
+        with self.client.post("/store/", json.dumps({
             "token": self.token.get('token'),
-            "vote": {
-                "a": "12",
-                "b": "64"
-            },
+            "vote": encrypt(self.voting['pub_key'], option['number'], self.rnd),
             "voter": self.usr.get('id'),
             "voting": VOTING
-        }), headers=headers)
-
+        }), headers=headers, catch_response=True) as r:
+            # once the Tally users stop the voting the votes are refused
+            if r.status_code == 401 and state['closed']:
+                r.success()
 
     def on_quit(self):
         self.voter = None
-        
+
+
+class DefTally(SequentialTaskSet):
+
+    def on_start(self):
+        wait = state['start'] + TALLY_AFTER - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        self.token = self.client.post("/authentication/login/", {
+            "username": ADMIN,
+            "password": ADMIN_PASS,
+        }).json()
+        self.headers = {'Authorization': 'Token ' + self.token.get('token')}
+
+    def action(self, action, done):
+        '''
+        Every Tally user sends the action, the ones that come later get a 400
+        with the done message and that's not a failure. True when the action
+        is done.
+        '''
+
+        with self.client.put('/voting/{}/'.format(VOTING), json={'action': action},
+                             headers=self.headers, name='/voting/[id]/ ' + action,
+                             catch_response=True) as r:
+            if r.status_code == 400 and done in r.text:
+                r.success()
+            return r.status_code == 200 or (r.status_code == 400 and done in r.text)
+
+    @task
+    def stop(self):
+        # only a stopped voting refuses the votes, other 401 are failures
+        if self.action('stop', 'already stopped'):
+            state['closed'] = True
+
+    @task
+    def tally(self):
+        self.action('tally', 'already tallied')
+
+    @task
+    def result(self):
+        get_voting(self.client)
+
+
 class DefAutenticar(SequentialTaskSet):
-    
+
     def on_start(self):
         # Realizar una solicitud GET para obtener el token CSRF y establecer las cookies
         response = self.client.get("/authentication/")
@@ -117,7 +259,12 @@ class DefUrlVarias(TaskSet):
     def español(self):
         self.client.get("/census/peticion/")
 
-    
+
+
+class Booth(HttpUser):
+    host = HOST
+    tasks = [DefBooth]
+    wait_time = between(3,5)
 
 class Visualizer(HttpUser):
     host = HOST
@@ -134,7 +281,88 @@ class Voters(HttpUser):
     tasks = [DefVoters]
     wait_time= between(3,5)
 
+class Tally(HttpUser):
+    host = HOST
+    tasks = [DefTally]
+    fixed_count = TALLY_USERS
+    wait_time = between(5,10)
+
 class Admin(HttpUser):
     host = HOST
     tasks = [DefUrlVarias]
-    wait_time= between(3,5)
\ No newline at end of file
+    wait_time= between(3,5)
+
+
+if PROFILE:
+    class Profile(LoadTestShape):
+        stages = PROFILES[PROFILE]
+
+        def tick(self):
+            run_time = self.get_run_time()
+            for end, users, spawn_rate in self.stages:
+                if run_time < end:
+                    return users, spawn_rate
+            return None
+
+
+@events.test_start.add_listener
+def on_test_start(environment, **kwargs):
+    state['start'] = time.time()
+    state['closed'] = False
+
+
+def summary_row(entry):
+    return {
+        'method': entry.method,
+        'name': entry.name,
+        'requests': entry.num_requests,
+        'failures': entry.num_failures,
+        'rps': entry.total_rps,
+        'avg': entry.avg_response_time,
+        'min': entry.min_response_time,
+        'max': entry.max_response_time,
+        'percentiles': {str(p): entry.get_response_time_percentile(p) for p in PERCENTILES},
+    }
+
+
+def compare(rows, path):
+    with open(path) as f:
+        baseline = {(r['method'], r['name']): r for r in json.load(f)['requests']}
+
+    print('\n{:<32} {:>10} {:>10} {:>10} {:>10}'.format(
+        'request', 'p50 before', 'p50 now', 'p95 before', 'p95 now'))
+    for row in rows:
+        old = baseline.get((row['method'], row['name']))
+        if not old:
+            continue
+        print('{:<32} {:>10} {:>10} {:>10} {:>10}'.format(
+            '{} {}'.format(row['method'] or '', row['name'])[:32],
+            old['percentiles']['0.5'], row['percentiles']['0.5'],
+            old['percentiles']['0.95'], row['percentiles']['0.95']))
+
+
+@events.quitting.add_listener
+def on_quitting(environment, **kwargs):
+    '''
+    Percentiles in ms of each request and of all of them, to compare runs
+    '''
+
+    stats = environment.stats
+    rows = [summary_row(e) for e in sorted(stats.entries.values(),
+                                            key=lambda e: (e.name, e.method))]
+    out = {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': HOST,
+        'voting': VOTING,
+        'profile': PROFILE,
+        'seed': SEED,
+        'users': [u.__name__ for u in environment.user_classes],
+        'requests': rows,
+        'total': summary_row(stats.total),
+    }
+    with open(SUMMARY, 'w') as f:
+        json.dump(out, f, indent=2)
+    print('\nSummary written to {}'.format(SUMMARY))
+
+    if COMPARE:
+        compare(rows, COMPARE)
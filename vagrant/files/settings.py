@@ -13,8 +13,19 @@ DATABASES = {
 
 STATIC_ROOT = '/home/decide/static/'
 MEDIA_ROOT = '/home/decide/static/media/'
+VOTING_BUNDLE_ROOT = '/home/decide/static/bundles/'
+VOTING_BUNDLE_URL = '/static/bundles/'
 ALLOWED_HOSTS = ['*']
 
+# shared by the gunicorn workers, so a voting invalidated in one of them is
+# invalidated in all. The table is created with ./manage.py createcachetable
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'decide_cache',
+    }
+}
+
 # Modules in use, commented modules that you won't use
 MODULES = [
     'authentication',